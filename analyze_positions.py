@@ -0,0 +1,366 @@
+"""This module is a command line tool to analyze positions in bulk.
+
+It reads one position per line, from a file or from the standard input, and
+writes one JSON line per position with its status, its value for the player
+to move and the best move. The lines may be:
+
+- a compact board, with 9 characters read row by row (`X`, `O` and `.` for an
+  empty square), optionally followed by a space and the player to move, like
+  `X.O.X.... O`;
+- a JSON object with the "board" (a compact board or a 3x3 list of
+  PIECE_EMPTY, PIECE_X and PIECE_O), and optionally "to_move" ("X" or "O"),
+  "toss" (true or false, if the turns are based on a coin toss) and "id"
+  (copied to the output).
+
+If the player to move isn't given, it's X when both players have the same
+number of pieces and O otherwise.
+
+The lines are read in batches, analyzed by a pool of processes and written
+in the same order they were read. Only a few batches are kept in memory at
+once, so the input may be of any size. The memoization tables are filled
+before the pool is started, so every process begins with a warm cache.
+
+Run it with `$ python analyze_positions.py [file] [--toss]`.
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import sys
+
+import numpy as np
+
+import game_engine as engine
+import minimax as ai
+
+PIECE_TO_CHAR = {
+    engine.PIECE_EMPTY: ".",
+    engine.PIECE_X: "X",
+    engine.PIECE_O: "O",
+}
+""" The character of each piece on a compact board """
+
+CHAR_TO_PIECE = {
+    ".": engine.PIECE_EMPTY,
+    "-": engine.PIECE_EMPTY,
+    "_": engine.PIECE_EMPTY,
+    "X": engine.PIECE_X,
+    "x": engine.PIECE_X,
+    "O": engine.PIECE_O,
+    "o": engine.PIECE_O,
+}
+""" The piece of each character accepted on a compact board """
+
+STATUS = {
+    engine.PIECE_EMPTY: "ongoing",
+    engine.PIECE_X: "X",
+    engine.PIECE_O: "O",
+    engine.DRAW_ID: "draw",
+}
+""" The status written for each return of `minimax.is_game_over` """
+
+BATCHES_PER_PROCESS = 2
+""" How many batches are sent to each process before waiting for the first
+one to finish """
+
+
+def warm_cache():
+    """Fills the memoization tables of `minimax.analyze` with every position
+    reachable from the empty board, for both players and both modes."""
+    board = np.full((3, 3), engine.PIECE_EMPTY, dtype=int)
+    for ai_piece in (engine.PIECE_X, engine.PIECE_O):
+        ai.set_ai_piece(ai_piece)
+        for toss_turn in (False, True):
+            ai.analyze(board, maxi=True, toss_turn=toss_turn)
+            ai.analyze(board, maxi=False, toss_turn=toss_turn)
+
+
+def board_to_str(board):
+    """Returns the compact representation of a board.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The 3x3 board.
+
+    Returns
+    -------
+    compact : str
+        The 9 characters of the board, row by row.
+    """
+    return "".join(PIECE_TO_CHAR[piece] for piece in board.reshape(-1))
+
+
+def _parse_board(board):
+    if isinstance(board, str):
+        if len(board) != 9 or any(char not in CHAR_TO_PIECE for char in board):
+            raise ValueError(f"invalid compact board {board!r}")
+        pieces = [CHAR_TO_PIECE[char] for char in board]
+    else:
+        pieces = [piece for row in board for piece in row]
+        if len(pieces) != 9 or any(piece not in PIECE_TO_CHAR for piece in pieces):
+            raise ValueError(f"invalid board {board!r}")
+    return np.array(pieces, dtype=int).reshape(3, 3)
+
+
+def read_line(line):
+    """Reads the fields of a line of the input, without checking them.
+
+    Parameters
+    ----------
+    line : str
+        A compact board or a JSON object, as described in the module.
+
+    Returns
+    -------
+    data : dict
+        The JSON object, or a dictionary with the "board" and "to_move" (None
+        if not given) of a compact board.
+
+    Raises
+    ------
+    ValueError
+        if the line isn't valid JSON or doesn't have one or two fields
+    """
+    line = line.strip()
+    if line.startswith("{"):
+        return json.loads(line)
+
+    fields = line.split()
+    if not 1 <= len(fields) <= 2:
+        raise ValueError(f"invalid line {line!r}")
+    return {"board": fields[0], "to_move": fields[1] if len(fields) == 2 else None}
+
+
+def parse_position(data, toss_turn=False):
+    """Builds a position from the fields of a line.
+
+    Parameters
+    ----------
+    data : dict
+        The fields returned by `read_line`.
+    toss_turn : bool, default=False
+        If the turns are based on a coin toss, when the line doesn't say it.
+
+    Returns
+    -------
+    position : dict
+        With the keys "board" (a numpy ndarray), "to_move" (PIECE_X or
+        PIECE_O), "toss" and "id" (None if not given).
+
+    Raises
+    ------
+    ValueError
+        if the fields aren't a valid position
+    """
+    toss = data.get("toss", toss_turn)
+    if not isinstance(toss, bool):
+        raise ValueError(f"invalid toss {toss!r}")
+
+    position = {"id": data.get("id"), "toss": toss, "to_move": None}
+    position["board"] = _parse_board(data.get("board"))
+
+    to_move = data.get("to_move")
+    if to_move is None:
+        n_x = np.count_nonzero(position["board"] == engine.PIECE_X)
+        n_o = np.count_nonzero(position["board"] == engine.PIECE_O)
+        position["to_move"] = engine.PIECE_X if n_x == n_o else engine.PIECE_O
+    elif to_move in ("X", "x", "O", "o"):
+        position["to_move"] = CHAR_TO_PIECE[to_move]
+    else:
+        raise ValueError(f"invalid player to move {to_move!r}")
+
+    return position
+
+
+def parse_line(line, toss_turn=False):
+    """Reads a position from a line of the input.
+
+    Parameters
+    ----------
+    line : str
+        A compact board or a JSON object, as described in the module.
+    toss_turn : bool, default=False
+        If the turns are based on a coin toss, when the line doesn't say it.
+
+    Returns
+    -------
+    position : dict
+        The position returned by `parse_position`.
+
+    Raises
+    ------
+    ValueError
+        if the line isn't a valid position
+    """
+    return parse_position(read_line(line), toss_turn)
+
+
+def analyze_position(position):
+    """Analyzes a position for the player to move.
+
+    Parameters
+    ----------
+    position : dict
+        A position returned by `parse_line`.
+
+    Returns
+    -------
+    result : dict
+        With the "id", the compact "board", "to_move", "toss", the "status"
+        ("ongoing", "X", "O" or "draw"), the "value" for the player to move
+        (the same of `minimax.minimax`, or `minimax.expected_minimax` with the
+        coin toss) and the "best_move" (None if the game is over).
+    """
+    board = position["board"]
+    to_move = position["to_move"]
+    game_over = ai.is_game_over(board)
+
+    if game_over == engine.PIECE_EMPTY:
+        ai.set_ai_piece(to_move)
+        evaluations = ai.analyze(board, maxi=True, toss_turn=position["toss"])
+        # The first of the best moves, as `minimax.move` would play.
+        best_move = max(evaluations, key=evaluations.get)
+        value = evaluations[best_move]
+        best_move = list(best_move)
+    else:
+        best_move = None
+        if game_over == engine.DRAW_ID:
+            value = 0
+        else:
+            value = 1 if game_over == to_move else -1
+
+    return {
+        "id": position["id"],
+        "board": board_to_str(board),
+        "to_move": PIECE_TO_CHAR[to_move],
+        "toss": position["toss"],
+        "status": STATUS[int(game_over)],
+        "value": value,
+        "best_move": best_move,
+    }
+
+
+def analyze_batch(job):
+    """Analyzes a batch of lines.
+
+    Parameters
+    ----------
+    job : tuple
+        A tuple `(lines, toss_turn)`, with the lines of the input and the
+        default mode.
+
+    Returns
+    -------
+    outputs : list
+        One JSON string for each line. If a line is invalid, its object has
+        only the "error" key (and "id", if it could be read).
+    """
+    lines, toss_turn = job
+    outputs = []
+    for line in lines:
+        data = dict()
+        try:
+            data = read_line(line)
+            result = analyze_position(parse_position(data, toss_turn))
+        except (ValueError, TypeError, KeyError) as error:
+            result = {"error": str(error)}
+            if isinstance(data, dict) and "id" in data:
+                result = {"id": data["id"], "error": str(error)}
+        outputs.append(json.dumps(result))
+    return outputs
+
+
+def read_batches(lines, batch_size):
+    """Groups the non empty lines of the input.
+
+    Parameters
+    ----------
+    lines : iterable
+        The lines of the input.
+    batch_size : int
+        The maximum number of lines of each batch.
+
+    Yields
+    ------
+    batch : list
+        A list of lines.
+    """
+    batch = []
+    for line in lines:
+        if not line.strip():
+            continue
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run(lines, output, toss_turn=False, processes=None, batch_size=256):
+    """Analyzes every line of the input and writes the results in order.
+
+    Parameters
+    ----------
+    lines : iterable
+        The lines of the input.
+    output : file
+        Where the JSON lines are written.
+    toss_turn : bool, default=False
+        If the turns are based on a coin toss, when a line doesn't say it.
+    processes : int, optional
+        The number of processes. Defaults to the number of CPUs. If it's 1,
+        the lines are analyzed in this process.
+    batch_size : int, default=256
+        How many lines are sent to a process at once.
+    """
+    warm_cache()
+    jobs = ((batch, toss_turn) for batch in read_batches(lines, batch_size))
+
+    if processes == 1:
+        for job in jobs:
+            output.write("\n".join(analyze_batch(job)) + "\n")
+            output.flush()
+        return
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    with multiprocessing.Pool(processes) as pool:
+        pending = collections.deque()
+        for job in jobs:
+            pending.append(pool.apply_async(analyze_batch, (job,)))
+            if len(pending) >= processes * BATCHES_PER_PROCESS:
+                output.write("\n".join(pending.popleft().get()) + "\n")
+                output.flush()
+        while pending:
+            output.write("\n".join(pending.popleft().get()) + "\n")
+            output.flush()
+
+
+def main():
+    """Runs the analysis from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Analyzes tic-tac-toe positions, one per line."
+    )
+    parser.add_argument(
+        "input", nargs="?", default="-", help="input file (default: stdin)"
+    )
+    parser.add_argument(
+        "--toss", action="store_true", help="turns are based on a coin toss"
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.input == "-":
+        run(sys.stdin, sys.stdout, args.toss, args.processes, args.batch_size)
+    else:
+        with open(args.input) as input_file:
+            run(input_file, sys.stdout, args.toss, args.processes, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""This module compares the speed of the search implementations.
+
+Run it with `$ python benchmark.py`. For each mode (plain minimax and the
+coin toss expected minimax) it times every implementation on the same
+positions, checks that they all agree with the Python reference and prints
+the speedup over it.
+"""
+
+import time
+
+import numpy as np
+
+import game_engine as engine
+import minimax as ai
+import minimax_jit as jit
+
+POSITIONS = [
+    [],
+    [(1, 1)],
+    [(0, 0)],
+    [(0, 1)],
+    [(0, 0), (1, 1)],
+    [(1, 1), (0, 2)],
+    [(0, 1), (1, 0), (2, 2)],
+    [(0, 0), (1, 1), (2, 2)],
+    [(0, 2), (1, 1), (2, 0), (0, 0)],
+]
+""" The positions used by the benchmark, as the squares played from the empty
+board (X plays first) """
+
+REPEAT = 3
+""" How many times each search is timed (the best time is kept) """
+
+
+def make_board(squares):
+    """Builds a board playing `squares` in order, starting with X.
+
+    Parameters
+    ----------
+    squares : list
+        A list of location tuples.
+
+    Returns
+    -------
+    board : numpy ndarray
+        The 3x3 board.
+    """
+    board = np.full((3, 3), engine.PIECE_EMPTY, dtype=int)
+    piece = engine.PIECE_X
+    for loc in squares:
+        board[loc] = piece
+        piece = engine.get_opponent(piece)
+    return board
+
+
+def _clear_memos():
+    ai.MEMO_BOARD.clear()
+    ai.MEMO_STAR.clear()
+    jit.clear_memo()
+
+
+def _python_minimax(board):
+    return ai.minimax(board)
+
+
+def _negamax(board):
+    return ai.negamax_search(board)
+
+
+def _aspiration_negamax(board):
+    return ai.negamax_search(board, ai.PREVIOUS_VALUE)
+
+
+def _jit_minimax(board):
+    return jit.minimax(board, ai.AI_PIECE, ai.PLAYER_PIECE)
+
+
+def _python_expected(board):
+    return ai.expected_minimax(board)
+
+
+def _star_expected(board):
+    return ai.star_expected_minimax(board)
+
+
+def _jit_expected(board):
+    return jit.expected_minimax(board, ai.AI_PIECE, ai.PLAYER_PIECE)
+
+
+def get_modes():
+    """Returns the implementations to compare for each mode.
+
+    Returns
+    -------
+    modes : dict
+        Maps the name of the mode to a list of `(name, function)` pairs. The
+        first pair is the reference the others are compared to. Each function
+        receives a board and returns a `(value, loc)` tuple for the AI to move.
+    """
+    modes = {
+        "minimax": [
+            ("python", _python_minimax),
+            ("negamax", _negamax),
+            ("aspiration", _aspiration_negamax),
+        ],
+        "expected": [("python", _python_expected), ("star", _star_expected)],
+    }
+    if jit.AVAILABLE:
+        modes["minimax"].append(("jit", _jit_minimax))
+        modes["expected"].append(("jit", _jit_expected))
+    return modes
+
+
+def _next_piece(squares):
+    return engine.PIECE_X if len(squares) % 2 == 0 else engine.PIECE_O
+
+
+def _set_previous_value(squares):
+    # The value the AI found on its previous move, as in a real game.
+    if len(squares) < 2:
+        ai.PREVIOUS_VALUE = None
+    else:
+        ai.PREVIOUS_VALUE = ai.exact_minimax(make_board(squares[:-2]))
+
+
+def time_search(function, board):
+    """Times a search from an empty memoization table.
+
+    Parameters
+    ----------
+    function : callable
+        One of the functions returned by `get_modes`.
+    board : numpy ndarray
+        The board to search.
+
+    Returns
+    -------
+    elapsed : float
+        The best time, in seconds, over `REPEAT` runs.
+    result : tuple
+        The `(value, loc)` returned by the search.
+    """
+    elapsed = float("inf")
+    result = None
+    for _ in range(REPEAT):
+        _clear_memos()
+        start = time.perf_counter()
+        result = function(board)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed, result
+
+
+def run(modes):
+    """Runs the benchmark and prints a table for each mode.
+
+    Parameters
+    ----------
+    modes : dict
+        The dictionary returned by `get_modes`.
+
+    Raises
+    ------
+    AssertionError
+        if an implementation disagrees with the reference.
+    """
+    for mode, functions in modes.items():
+        # Compile the kernels before timing them.
+        for _, function in functions:
+            function(make_board([]))
+
+        totals = {name: 0.0 for name, _ in functions}
+        for ai_piece in (engine.PIECE_X, engine.PIECE_O):
+            ai.set_ai_piece(ai_piece)
+            for squares in POSITIONS:
+                board = make_board(squares)
+                if ai_piece != _next_piece(squares):
+                    continue
+                _set_previous_value(squares)
+
+                reference = None
+                for name, function in functions:
+                    elapsed, result = time_search(function, board)
+                    totals[name] += elapsed
+                    if reference is None:
+                        reference = result
+                    assert result == reference, (
+                        f"{mode}/{name} returned {result} instead of "
+                        f"{reference} on {squares}"
+                    )
+
+        reference_time = totals[functions[0][0]]
+        print(f"\n== {mode} ==")
+        for name, _ in functions:
+            speedup = reference_time / totals[name]
+            print(f"{name:>12}: {totals[name] * 1000:10.2f} ms  {speedup:8.1f}x")
+
+
+def count_nodes(mode, functions):
+    """Prints how many boards each search visits on the benchmark positions.
+
+    Parameters
+    ----------
+    mode : str
+        The name of the mode, used as the title of the table.
+    functions : list
+        A list of `(name, function)` pairs of Python searches that increment
+        `minimax.NODE_COUNT`.
+    """
+    print(f"\n== {mode} nodes ==")
+    for name, function in functions:
+        total = 0
+        for ai_piece in (engine.PIECE_X, engine.PIECE_O):
+            ai.set_ai_piece(ai_piece)
+            for squares in POSITIONS:
+                if ai_piece != _next_piece(squares):
+                    continue
+                _set_previous_value(squares)
+                _clear_memos()
+                ai.NODE_COUNT = 0
+                function(make_board(squares))
+                total += ai.NODE_COUNT
+        print(f"{name:>12}: {total:10d} nodes")
+
+
+def main():
+    """Runs the benchmark over all the available implementations."""
+    modes = get_modes()
+    run(modes)
+    for mode, functions in modes.items():
+        count_nodes(mode, [pair for pair in functions if pair[0] != "jit"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """This is the module for all of drawing engine of the game."""
 
+import collections
+
 import pygame
 
 import colors
@@ -7,6 +9,83 @@ import game_engine as engine
 import global_vars as gvars
 import minimax as ai
 
+SHOW_HINTS = False
+""" If the evaluation of each legal move is drawn over the board """
+
+_HINTS_CACHE = dict()
+""" The last evaluations computed by `draw_hints`, it's keys are a tuple
+`(ai_piece, toss_turn, board)`, where `board` is the hashed value of a board """
+
+_HINTS_GLYPHS = dict()
+""" The rendered texts of the evaluations, keyed by the text itself """
+
+_GLYPHS = dict()
+""" The rendered texts of the pieces and game over messages, keyed by a tuple
+`(font, text, color)` """
+
+SUB_BOARDS_BYTES = 16 * 2**20
+""" The maximum size, in bytes, of the rendered sub-boards of the ultimate
+variant kept in memory. A sub-board of the default window takes about 80 kB """
+
+SUB_BOARD_PADDING = 3 * gvars.TICKS_PADDING
+""" The space between a sub-board of the ultimate variant and the lines of
+the big cross """
+
+
+def new_cache(max_bytes):
+    """Creates a cache of rendered images bounded by their size.
+
+    Parameters
+    ----------
+    max_bytes : int
+        When the images take more than this, the least recently used ones are
+        forgotten.
+
+    Returns
+    -------
+    cache : dict
+        With the keys "images" (an OrderedDict that maps each key to a tuple
+        `(image, n_bytes)`, from the least to the most recently used),
+        "bytes" (their total size) and "max_bytes".
+    """
+    return {"images": collections.OrderedDict(), "bytes": 0, "max_bytes": max_bytes}
+
+
+def cache_get(cache, key):
+    """Returns an image of a cache created by `new_cache`, or None if it's not
+    there."""
+    if key not in cache["images"]:
+        return None
+    cache["images"].move_to_end(key)
+    return cache["images"][key][0]
+
+
+def cache_put(cache, key, image, n_bytes):
+    """Stores an image on a cache created by `new_cache`.
+
+    Parameters
+    ----------
+    cache : dict
+        The cache.
+    key : hashable
+        The key of the image.
+    image : object
+        The image, like a pygame Surface or a numpy ndarray.
+    n_bytes : int
+        The size of the image.
+    """
+    cache["images"][key] = (image, n_bytes)
+    cache["bytes"] += n_bytes
+    while cache["bytes"] > cache["max_bytes"]:
+        _, (_, old_bytes) = cache["images"].popitem(last=False)
+        cache["bytes"] -= old_bytes
+
+
+_SUB_BOARDS = new_cache(SUB_BOARDS_BYTES)
+""" The rendered sub-boards of the ultimate variant, keyed by a tuple
+`(board, winner_type, size)`, where `board` is the hashed value of a board """
+
+
 def _piece_type_to_txt(piece_type):
     piece_type_to_txt_dict = {
         engine.PIECE_X: "X",
@@ -24,6 +103,13 @@ def _piece_type_to_color(piece_type):
     return piece_type_to_color_dict[piece_type]
 
 
+def _glyph(font, text, color):
+    key = (font, text, color)
+    if key not in _GLYPHS:
+        _GLYPHS[key] = font.render(text, False, color)
+    return _GLYPHS[key]
+
+
 def _loc_to_coordinates(loc):
     column = (
         loc[0] * gvars.WIDTH // 3 - gvars.TICKS_WIDTH // 2 + 2 * gvars.TICKS_PADDING
@@ -49,7 +135,7 @@ def _coordinates_to_loc(coordinates):
     return (column, row)
 
 
-def draw_piece(piece_type, loc):
+def draw_piece(piece_type, loc, surface=None):
     """Draws a piece onto the screen.
 
     Params
@@ -58,32 +144,54 @@ def draw_piece(piece_type, loc):
         One option between PIECE_EMPTY, PIECE_X or PIECE_O
     loc : tuple
         A location tuple with the square to draw the piece
+    surface : pygame Surface, optional
+        Where to draw. Defaults to the game window.
     """
+    if surface is None:
+        surface = gvars.WIN
 
     coordinates = _loc_to_coordinates(loc)
-    piece_txt = gvars.PIECES_FONT.render(
-        _piece_type_to_txt(piece_type), False, _piece_type_to_color(piece_type)
+    piece_txt = _glyph(
+        gvars.PIECES_FONT,
+        _piece_type_to_txt(piece_type),
+        _piece_type_to_color(piece_type),
     )
-    gvars.WIN.blit(piece_txt, coordinates)
+    surface.blit(piece_txt, coordinates)
+
 
+def draw_pieces(board=None, surface=None):
+    """Draws all the pieces onto the screen.
+
+    Params
+    ------
+    board : numpy ndarray, optional
+        The 3x3 board to draw. Defaults to the board of the game engine.
+    surface : pygame Surface, optional
+        Where to draw. Defaults to the game window.
+    """
+    if board is None:
+        board = engine.BOARD
 
-def draw_pieces():
-    """Draws all the pieces onto the screen."""
     for i in range(3):
         for j in range(3):
-            piece_type = engine.get_piece((i, j))
+            piece_type = board[i, j]
             if piece_type != engine.PIECE_EMPTY:
-                draw_piece(piece_type, (i, j))
+                draw_piece(piece_type, (i, j), surface)
 
 
-def draw_game_over(winner_type):
+def draw_game_over(winner_type, surface=None):
     """Draws the game over message onto the screen.
 
     Params
     ------
     winner_type : const
         One of PIECE_X, PIECE_O or DRAW_ID
+    surface : pygame Surface, optional
+        Where to draw. Defaults to the game window.
     """
+    if surface is None:
+        surface = gvars.WIN
+
     winner_player_dict = {
         engine.PIECE_X: "X",
         engine.PIECE_O: "O",
@@ -101,16 +209,72 @@ def draw_game_over(winner_type):
         color = color_dict[winner_type]
         text = f"PLAYER {winner_player}"
 
-    text_rend = gvars.END_FONT.render(text, False, color)
+    text_rend = _glyph(gvars.END_FONT, text, color)
     width = (gvars.WIDTH - text_rend.get_width()) // 2
     height = gvars.HEIGHT // 2 - text_rend.get_height() // 2
 
     pygame.draw.rect(
-        gvars.WIN,
+        surface,
         colors.SHADOW,
         (width, height, text_rend.get_width(), text_rend.get_height()),
     )
-    gvars.WIN.blit(text_rend, (width, height))
+    surface.blit(text_rend, (width, height))
+
+
+def _value_to_hint(value):
+    if value > 0:
+        return f"+{value:g}", colors.GREEN
+    if value < 0:
+        return f"{value:g}", colors.RED
+    return "0", colors.SHADOW
+
+
+def _hint_glyph(text, color):
+    if text not in _HINTS_GLYPHS:
+        _HINTS_GLYPHS[text] = gvars.HINTS_FONT.render(text, True, color)
+    return _HINTS_GLYPHS[text]
+
+
+def get_hints(board, toss_turn=False):
+    """Returns the evaluation of each legal move for the player.
+
+    The evaluations of the last board are cached, so this function can be
+    called at every frame.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board, with the player to move.
+    toss_turn : bool, default=False
+        If the turns will be based on a coin toss or not.
+
+    Returns
+    -------
+    hints : dict
+        Maps each legal location tuple to its value from the player's point of
+        view (the opposite of the AI's).
+    """
+    key = (ai.AI_PIECE, toss_turn, engine.hash_board(board))
+    if key not in _HINTS_CACHE:
+        _HINTS_CACHE.clear()
+        evaluations = ai.analyze(board, maxi=False, toss_turn=toss_turn)
+        _HINTS_CACHE[key] = {loc: -value for loc, value in evaluations.items()}
+    return _HINTS_CACHE[key]
+
+
+def draw_hints(hints):
+    """Draws the evaluation of each legal move over its square.
+
+    Params
+    ------
+    hints : dict
+        Maps location tuples to values, as returned by `get_hints`.
+    """
+    for loc, value in hints.items():
+        glyph = _hint_glyph(*_value_to_hint(value))
+        x = loc[1] * gvars.WIDTH // 3 + 2 * gvars.TICKS_PADDING
+        y = loc[0] * gvars.HEIGHT // 3 + gvars.TICKS_PADDING
+        gvars.WIN.blit(glyph, (x, y))
 
 
 def handle_mouse_pressed():
@@ -131,9 +295,18 @@ def handle_mouse_pressed():
             ai.move(engine.BOARD, engine.FLIPPING_COIN, ai.AI_VERBOSE)
 
 
-def draw_background():
-    """Draws the background cross."""
-    gvars.WIN.fill(colors.WHITE)
+def draw_background(surface=None):
+    """Draws the background cross.
+
+    Params
+    ------
+    surface : pygame Surface, optional
+        Where to draw. Defaults to the game window.
+    """
+    if surface is None:
+        surface = gvars.WIN
+
+    surface.fill(colors.WHITE)
 
     for i in range(1, 3):
         x = gvars.WIDTH // 3 * i - gvars.TICKS_WIDTH // 2
@@ -142,7 +315,7 @@ def draw_background():
         height = gvars.HEIGHT - 2 * gvars.TICKS_PADDING
 
         tick = pygame.Rect(x, y, width, height)
-        pygame.draw.rect(gvars.WIN, colors.BLACK, tick)
+        pygame.draw.rect(surface, colors.BLACK, tick)
 
     for i in range(1, 3):
         x = gvars.TICKS_PADDING
@@ -152,7 +325,95 @@ def draw_background():
         width = gvars.WIDTH - 2 * gvars.TICKS_PADDING
 
         tick = pygame.Rect(x, y, width, height)
-        pygame.draw.rect(gvars.WIN, colors.BLACK, tick)
+        pygame.draw.rect(surface, colors.BLACK, tick)
+
+
+def _sub_board_size():
+    return (
+        gvars.WIDTH // 3 - 2 * SUB_BOARD_PADDING,
+        gvars.HEIGHT // 3 - 2 * SUB_BOARD_PADDING,
+    )
+
+
+def _sub_board_surface(board, winner_type, size):
+    # Each sub-board is drawn as a whole game on an off-screen surface and
+    # shrunk into its square, only once for each position.
+    key = (engine.hash_board(board), winner_type, size)
+    sub_board = cache_get(_SUB_BOARDS, key)
+    if sub_board is None:
+        surface = pygame.Surface((gvars.WIDTH, gvars.HEIGHT))
+        draw_background(surface)
+        draw_pieces(board, surface)
+        if winner_type != engine.PIECE_EMPTY:
+            draw_game_over(winner_type, surface)
+        sub_board = pygame.transform.smoothscale(surface, size)
+        n_bytes = sub_board.get_pitch() * sub_board.get_height()
+        cache_put(_SUB_BOARDS, key, sub_board, n_bytes)
+    return sub_board
+
+
+def draw_ultimate(boards, winners, playable, winner_type=None, surface=None):
+    """Draws a game of the ultimate variant.
+
+    Params
+    ------
+    boards : list
+        The 9 sub-boards (row by row), each one a 3x3 numpy ndarray.
+    winners : list
+        The winner of each sub-board: PIECE_X, PIECE_O, DRAW_ID or
+        PIECE_EMPTY.
+    playable : list
+        The indices of the sub-boards where the next move may be, which are
+        highlighted.
+    winner_type : const, optional
+        One of PIECE_X, PIECE_O or DRAW_ID to draw the game over message.
+    surface : pygame Surface, optional
+        Where to draw. Defaults to the game window.
+    """
+    if surface is None:
+        surface = gvars.WIN
+
+    draw_background(surface)
+    size = _sub_board_size()
+    for board in range(9):
+        x = board % 3 * gvars.WIDTH // 3 + SUB_BOARD_PADDING
+        y = board // 3 * gvars.HEIGHT // 3 + SUB_BOARD_PADDING
+        if board in playable:
+            highlight = pygame.Rect(x, y, size[0], size[1]).inflate(
+                gvars.TICKS_PADDING, gvars.TICKS_PADDING
+            )
+            pygame.draw.rect(surface, colors.LIGHTGREEN, highlight)
+        sub_board = _sub_board_surface(boards[board], winners[board], size)
+        surface.blit(sub_board, (x, y))
+
+    if winner_type is not None and winner_type != engine.PIECE_EMPTY:
+        draw_game_over(winner_type, surface)
+
+
+def coordinates_to_ultimate_move(coordinates):
+    """Finds the square of the ultimate variant under a point of the window.
+
+    Params
+    ------
+    coordinates : tuple
+        The `(x, y)` coordinates, as returned by `pygame.mouse.get_pos`.
+
+    Returns
+    -------
+    move : tuple
+        A tuple `(board, square)`, like the moves of `ultimate.get_moves`, or
+        None if the point isn't over a sub-board.
+    """
+    width, height = _sub_board_size()
+    board_column = min(coordinates[0] * 3 // gvars.WIDTH, 2)
+    board_row = min(coordinates[1] * 3 // gvars.HEIGHT, 2)
+    x = coordinates[0] - board_column * gvars.WIDTH // 3 - SUB_BOARD_PADDING
+    y = coordinates[1] - board_row * gvars.HEIGHT // 3 - SUB_BOARD_PADDING
+    if not (0 <= x < width and 0 <= y < height):
+        return None
+
+    square = y * 3 // height * 3 + x * 3 // width
+    return (board_row * 3 + board_column, square)
 
 
 def draw_frame():
@@ -165,6 +426,8 @@ def draw_frame():
 
     if engine.WINNER_TYPE != engine.PIECE_EMPTY:
         draw_game_over(engine.WINNER_TYPE)
+    elif SHOW_HINTS and engine.get_current_player_type() == ai.PLAYER_PIECE:
+        draw_hints(get_hints(engine.BOARD, engine.FLIPPING_COIN))
 
 
 def main():
@@ -69,12 +69,34 @@ def hash_board(board):
 
     for i in range(3):
         for j in range(3):
-            hash_num += board[i][j] * 3 ** exp
+            hash_num += board[i][j] * 3**exp
             exp += 1
 
     return hash_num
 
 
+def unhash_board(hash_num):
+    """This function does the opposite of `hash_board`: it gets a hash value
+    and returns the board.
+
+    Parameters
+    ----------
+    hash_num : int
+        The hash value of the board.
+
+    Returns
+    -------
+    board : numpy ndarray
+        The 3x3 matrix of the board.
+    """
+    board = np.full((3, 3), PIECE_EMPTY, dtype=int)
+
+    for exp in range(9):
+        hash_num, board[exp // 3, exp % 3] = divmod(hash_num, 3)
+
+    return board
+
+
 def put_piece(piece_type, loc):
     """Modify BOARD to put the piece_type in the position loc.
 
@@ -167,12 +189,92 @@ def get_current_player_type():
     return PIECE_X if PLAYER_TURN == 1 else PIECE_O
 
 
+def get_opponent(piece_type):
+    """Returns the piece of the other player.
+
+    Parameters
+    ----------
+    piece_type : const
+        One of PIECE_X or PIECE_O.
+
+    Returns
+    -------
+    opponent_type : const
+        PIECE_O if `piece_type` is PIECE_X and PIECE_X otherwise.
+    """
+    return PIECE_X + PIECE_O - piece_type
+
+
 def _array_game_over(array):
     if array[0] == PIECE_EMPTY:
         return False
     return np.all(array == array[0])
 
 
+def get_lines(rows=3, columns=3, k=3):
+    """Returns every line of `k` squares in a row of a board.
+
+    Parameters
+    ----------
+    rows : int, default=3
+        The number of rows of the board.
+    columns : int, default=3
+        The number of columns of the board.
+    k : int, default=3
+        How many pieces in a row are needed to win.
+
+    Returns
+    -------
+    lines : list
+        A list of lines, each one a tuple with the `k` location tuples of its
+        squares (horizontal, vertical, main diagonal and off diagonal lines,
+        in this order).
+    """
+    lines = []
+    for direction in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for i in range(rows):
+            for j in range(columns):
+                last_i = i + direction[0] * (k - 1)
+                last_j = j + direction[1] * (k - 1)
+                if 0 <= last_i < rows and 0 <= last_j < columns:
+                    lines.append(
+                        tuple(
+                            (i + direction[0] * step, j + direction[1] * step)
+                            for step in range(k)
+                        )
+                    )
+    return lines
+
+
+def get_winner(board, k=3):
+    """Checks if any player has `k` pieces in a row on a board of any size.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        A matrix where each position is one of PIECE_EMPTY, PIECE_X or
+        PIECE_O.
+    k : int, default=3
+        How many pieces in a row are needed to win.
+
+    Returns
+    -------
+    - PIECE_X if X won;
+    - PIECE_O if O won;
+    - DRAW_ID if the board is full;
+    - PIECE_EMPTY if the game isn't over.
+    """
+    for line in get_lines(board.shape[0], board.shape[1], k):
+        array = np.array([board[loc] for loc in line])
+        if _array_game_over(array):
+            return array[0]
+
+    if np.all(board != PIECE_EMPTY):
+        return DRAW_ID
+
+    return PIECE_EMPTY
+
+
 def is_game_over():
     """This function checks if the game is over or not, modifing the global
     variable WINNER_TYPE if any player won or if it's a draw.
@@ -14,3 +14,4 @@ WIN = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.font.init()
 PIECES_FONT = pygame.font.SysFont("Comic Sans MS", WIDTH // 2)
 END_FONT = pygame.font.SysFont("Comic Sans MS", 120)
+HINTS_FONT = pygame.font.SysFont("Comic Sans MS", 32)
@@ -0,0 +1,281 @@
+"""This module renders games without opening a window.
+
+It uses SDL's dummy video driver and draws with the same functions of the
+`drawing_engine` module, but on off-screen surfaces, so whole batches of
+games can be turned into NumPy arrays or image sequences.
+
+A game is a list of moves `(piece_type, loc)` in the order they were played.
+Its frames are the empty board followed by the board after each move, with
+the game over message on the last one if the game ended.
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import multiprocessing
+import random
+import time
+
+import numpy as np
+import pygame
+
+import drawing_engine as drawing
+import game_engine as engine
+import global_vars as gvars
+import minimax as ai
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+_SURFACE = None
+""" The off-screen surface where the frames are drawn, created on demand by
+each process """
+
+CACHE_BYTES = 128 * 2**20
+""" The maximum size, in bytes, of the frames cached by each process. A frame
+of the window size takes about 1 MB """
+
+_FRAMES = drawing.new_cache(CACHE_BYTES)
+""" The cached frames, keyed by a tuple `(board, winner_type, size)`, where
+`board` is the hashed value of a board """
+
+
+def _get_surface():
+    global _SURFACE
+
+    if _SURFACE is None:
+        _SURFACE = pygame.Surface((gvars.WIDTH, gvars.HEIGHT))
+    return _SURFACE
+
+
+def game_positions(moves):
+    """Yields every position of a game.
+
+    Parameters
+    ----------
+    moves : list
+        The moves of the game, as `(piece_type, loc)` tuples.
+
+    Yields
+    ------
+    board : numpy ndarray
+        The 3x3 board. The same array is modified between positions, so copy
+        it if you need to keep it.
+    winner_type : const
+        The return of `minimax.is_game_over` on the board.
+    """
+    board = np.full((3, 3), engine.PIECE_EMPTY, dtype=int)
+    yield board, engine.PIECE_EMPTY
+
+    for piece_type, loc in moves:
+        board[loc[0], loc[1]] = piece_type
+        yield board, ai.is_game_over(board)
+
+
+def render_position(board, winner_type=engine.PIECE_EMPTY, size=None):
+    """Renders a position into an image.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The 3x3 board.
+    winner_type : const, default=PIECE_EMPTY
+        One of PIECE_X, PIECE_O or DRAW_ID to draw the game over message, or
+        PIECE_EMPTY if the game isn't over.
+    size : tuple, optional
+        The `(width, height)` of the image. Defaults to the window size.
+
+    Returns
+    -------
+    image : numpy ndarray
+        An array of shape `(height, width, 3)` with the RGB pixels.
+    """
+    surface = _get_surface()
+    drawing.draw_background(surface)
+    drawing.draw_pieces(board, surface)
+    if winner_type != engine.PIECE_EMPTY:
+        drawing.draw_game_over(winner_type, surface)
+
+    if size is not None and tuple(size) != surface.get_size():
+        surface = pygame.transform.smoothscale(surface, size)
+
+    return pygame.surfarray.array3d(surface).transpose(1, 0, 2)
+
+
+def _render_cached(hash_num, winner_type, size):
+    # The same positions appear in many games, so each process keeps the
+    # frames it already rendered, keyed by `engine.hash_board`, forgetting the
+    # least recently used ones when they take more than `CACHE_BYTES`.
+    key = (hash_num, winner_type, size)
+    frame = drawing.cache_get(_FRAMES, key)
+    if frame is None:
+        frame = render_position(engine.unhash_board(hash_num), winner_type, size)
+        drawing.cache_put(_FRAMES, key, frame, frame.nbytes)
+    return frame
+
+
+def render_game(moves, size=None):
+    """Renders all the frames of a game.
+
+    Parameters
+    ----------
+    moves : list
+        The moves of the game, as `(piece_type, loc)` tuples.
+    size : tuple, optional
+        The `(width, height)` of the frames. Defaults to the window size.
+
+    Returns
+    -------
+    frames : numpy ndarray
+        An array of shape `(len(moves) + 1, height, width, 3)`.
+
+    The frames are cached by position in each process (up to `CACHE_BYTES`),
+    so games sharing positions are rendered faster.
+    """
+    size = None if size is None else tuple(size)
+    return np.stack(
+        [
+            _render_cached(engine.hash_board(board), winner_type, size)
+            for board, winner_type in game_positions(moves)
+        ]
+    )
+
+
+def _render_game_job(job):
+    moves, size = job
+    return render_game(moves, size)
+
+
+def render_games(games, size=None, processes=None, chunksize=16):
+    """Renders a batch of games using a pool of processes.
+
+    Parameters
+    ----------
+    games : iterable
+        The games to render, each one a list of `(piece_type, loc)` moves.
+    size : tuple, optional
+        The `(width, height)` of the frames. Defaults to the window size.
+    processes : int, optional
+        The number of worker processes. Defaults to the number of CPUs. If
+        it's 1, the games are rendered in this process.
+    chunksize : int, default=16
+        How many games are sent to a worker at once.
+
+    Yields
+    ------
+    frames : numpy ndarray
+        The return of `render_game` for each game, in the same order as
+        `games`.
+    """
+    jobs = ((moves, size) for moves in games)
+
+    if processes == 1:
+        yield from map(_render_game_job, jobs)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(_render_game_job, jobs, chunksize)
+
+
+def save_png_sequence(frames, directory, prefix="frame"):
+    """Saves frames as numbered PNG files.
+
+    Parameters
+    ----------
+    frames : numpy ndarray
+        An array of shape `(n_frames, height, width, 3)`.
+    directory : str
+        The directory where the files are saved. It's created if needed.
+    prefix : str, default="frame"
+        The beginning of the name of the files.
+
+    Returns
+    -------
+    paths : list
+        The paths of the saved files.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for i, frame in enumerate(frames):
+        path = os.path.join(directory, f"{prefix}_{i:03d}.png")
+        surface = pygame.surfarray.make_surface(frame.transpose(1, 0, 2))
+        pygame.image.save(surface, path)
+        paths.append(path)
+    return paths
+
+
+def save_gif(frames, path, duration=500):
+    """Saves frames as an animated GIF. It needs Pillow to be installed.
+
+    Parameters
+    ----------
+    frames : numpy ndarray
+        An array of shape `(n_frames, height, width, 3)`.
+    path : str
+        The path of the GIF file.
+    duration : int, default=500
+        How long each frame is shown, in milliseconds.
+
+    Raises
+    ------
+    ImportError
+        if Pillow isn't installed
+    """
+    if Image is None:
+        raise ImportError("Pillow is needed to save GIFs.")
+
+    images = [Image.fromarray(frame) for frame in frames]
+    images[0].save(
+        path, save_all=True, append_images=images[1:], duration=duration, loop=0
+    )
+
+
+def random_game(rng=random):
+    """Plays a random game, alternating turns from X.
+
+    Parameters
+    ----------
+    rng : random.Random, optional
+        The random number generator.
+
+    Returns
+    -------
+    moves : list
+        The moves of the game, as `(piece_type, loc)` tuples.
+    """
+    squares = [(i, j) for i in range(3) for j in range(3)]
+    rng.shuffle(squares)
+
+    board = np.full((3, 3), engine.PIECE_EMPTY, dtype=int)
+    moves = []
+    piece_type = engine.PIECE_X
+    for loc in squares:
+        board[loc] = piece_type
+        moves.append((piece_type, loc))
+        if ai.is_game_over(board) != engine.PIECE_EMPTY:
+            break
+        piece_type = engine.get_opponent(piece_type)
+    return moves
+
+
+def main():
+    """Test function. Renders random games and prints the throughput."""
+    rng = random.Random(0)
+    games = [random_game(rng) for _ in range(1000)]
+
+    start = time.perf_counter()
+    n_frames = 0
+    for frames in render_games(games, size=(150, 150)):
+        n_frames += len(frames)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(games)} games ({n_frames} frames) in {elapsed:.2f} s")
+    print(f"{len(games) / elapsed * 60:.0f} games per minute")
+
+
+if __name__ == "__main__":
+    main()
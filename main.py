@@ -11,6 +11,7 @@ def welcome():
     """The function with the welcome message."""
     print("Welcome to my tic-tac-toe game.\n")
     print("Use R to restart the game.")
+    print("Use H to show or hide the evaluation of your moves.")
     print("Use Q to quit the game.\n")
 
 
@@ -66,6 +67,9 @@ def main():
                         verbose=verbose,
                     )
 
+                if event.key == pygame.K_h:
+                    drawing.SHOW_HINTS = not drawing.SHOW_HINTS
+
                 if event.key == pygame.K_q:
                     print("\nThanks for playing =)")
                     pygame.quit()
@@ -3,6 +3,7 @@
 import numpy as np
 
 import game_engine as engine
+import minimax_jit as jit
 
 AI_PIECE = engine.PIECE_X
 """" The type of the piece of the AI """
@@ -12,17 +13,54 @@ PLAYER_PIECE = engine.PIECE_O
 AI_VERBOSE = True
 """ Defines if the AI will print it's thoughts about the game """
 
+USE_JIT = jit.AVAILABLE
+""" If `move` will search with the compiled kernel of `minimax_jit` instead of
+the Python functions of this module. It's True whenever Numba is installed """
+
+ENGINE = None
+""" The search used by `move` when there's no coin toss. It can be "minimax",
+"negamax" or "jit". If None, it's "jit" if `USE_JIT` or "minimax" otherwise """
+
+PREVIOUS_VALUE = None
+""" The value of the last move of the AI, used as the center of the aspiration
+window of `negamax_search` """
+
+ASPIRATION_DELTA = 1
+""" Half of the width of the aspiration window of `negamax_search` """
+
 INF = 2
 """ A constant for a infinity amount """
 
 NULL_MOVE = (-1, -1)
 """ A constant for a null movement """
 
+MIN_VALUE, MAX_VALUE = -1, 1
+""" The bounds of the value of any board """
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+""" Constants for the kind of value kept on the `MEMO_STAR` hashtable """
+
+NODE_COUNT = 0
+""" The number of boards visited by `minimax`, `negamax`, `expected_minimax`
+and `star_expected_minimax` (the memoized ones are also counted). It's never
+reset by the search functions """
+
 MEMO_BOARD = dict()
 """ Memoization hashtable for the `expected_minimax` function, it's keys are a
-tuple `(maxi, board)`. Where `maxi` is True or False (if we're evaluating the
-maximizing player or not) and `board` is the hashed value of a board using the
-`engine.hash_board` function. """
+tuple `(ai_piece, maxi, board)`. Where `ai_piece` is the value of `AI_PIECE`,
+`maxi` is True or False (if we're evaluating the maximizing player or not) and
+`board` is the hashed value of a board using the `engine.hash_board` function.
+"""
+
+MEMO_EXACT = dict()
+""" Memoization hashtable for the `exact_minimax` function, it's keys are a
+tuple `(ai_piece, maxi, board)`. Where `ai_piece` is the value of `AI_PIECE`,
+`maxi` is True or False and `board` is the hashed value of a board. """
+
+MEMO_STAR = dict()
+""" Memoization hashtable for the `star_expected_minimax` function. It has the
+same keys as `MEMO_BOARD` and it's values are tuples `(value, move, kind)`,
+where `kind` is one of `EXACT`, `LOWER_BOUND` or `UPPER_BOUND`. """
 
 
 def init(board, ai_first=False, toss_turn=False, verbose=False):
@@ -41,18 +79,33 @@ def init(board, ai_first=False, toss_turn=False, verbose=False):
     verbose : bool, default=True
         If the AI will print the evaluation of the board or not.
     """
-    global AI_PIECE, PLAYER_PIECE, AI_VERBOSE, MEMO_BOARD
+    global AI_VERBOSE, MEMO_BOARD, PREVIOUS_VALUE
 
     AI_VERBOSE = verbose
+    PREVIOUS_VALUE = None
+    if USE_JIT:
+        jit.warm_up()
     engine.FLIPPING_COIN = toss_turn
 
     if ai_first:
-        AI_PIECE = engine.PIECE_X
-        PLAYER_PIECE = engine.PIECE_O
+        set_ai_piece(engine.PIECE_X)
         move(board, toss_turn=toss_turn, verbose=verbose)
     else:
-        AI_PIECE = engine.PIECE_O
-        PLAYER_PIECE = engine.PIECE_X
+        set_ai_piece(engine.PIECE_O)
+
+
+def set_ai_piece(ai_piece):
+    """Chooses the pieces of the AI and of the player, without moving.
+
+    Parameters
+    ----------
+    ai_piece : const
+        One of PIECE_X or PIECE_O, the piece of the maximizing player.
+    """
+    global AI_PIECE, PLAYER_PIECE
+
+    AI_PIECE = ai_piece
+    PLAYER_PIECE = engine.get_opponent(ai_piece)
 
 
 def _array_game_over(array):
@@ -156,6 +209,9 @@ def minimax(board, maxi=True, alpha=-INF, beta=INF):
     loc : tuple
         The best possible movement in the position.
     """
+    global NODE_COUNT
+    NODE_COUNT += 1
+
     game_over = is_game_over(board)
     # game over cases:
     if game_over == engine.DRAW_ID:  # draw
@@ -193,6 +249,101 @@ def minimax(board, maxi=True, alpha=-INF, beta=INF):
         return mini_value, best_move
 
 
+def negamax(board, color=1, alpha=-INF, beta=INF):
+    """The minimax algorithm in the negamax form, with principal variation
+    search. The value is always from the point of view of the player to move.
+
+    The first move is searched with the full window and the others with a
+    null window, only being searched again if they may be better. The search
+    stops as soon as a winning move is found.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board
+    color : int, default=1
+        1 if it's the AI's turn to move, -1 if it's the player's.
+    alpha : int, default=-INF
+        The alpha value (referent to the alpha-beta pruning technic)
+    beta : int, default=INF
+        The beta value (referent to the alpha-beta pruning technic)
+
+    Returns
+    -------
+    board_value : int
+        1 if the player to move wins, 0 if it's a draw and -1 if it loses (or a
+        bound of it, if it's outside of the window).
+    loc : tuple
+        The best possible movement in the position.
+    """
+    global NODE_COUNT
+    NODE_COUNT += 1
+
+    game_over = is_game_over(board)
+    # game over cases:
+    if game_over == engine.DRAW_ID:  # draw
+        return 0, NULL_MOVE
+    if game_over == AI_PIECE:  # ai wins
+        return color, NULL_MOVE
+    if game_over == PLAYER_PIECE:  # player wins
+        return -color, NULL_MOVE
+
+    piece = AI_PIECE if color == 1 else PLAYER_PIECE
+    best_value = -INF
+    best_move = NULL_MOVE
+    for new_board, move in get_moves(board, piece):
+        if best_move == NULL_MOVE:
+            value = -negamax(new_board, -color, -beta, -alpha)[0]
+        else:
+            # The values are integers, so (alpha, alpha + 1) is a null window.
+            value = -negamax(new_board, -color, -alpha - 1, -alpha)[0]
+            if alpha < value < beta:
+                value = -negamax(new_board, -color, -beta, -value)[0]
+
+        if value > best_value:
+            best_value = value
+            best_move = move
+
+        alpha = max(alpha, value)
+        if alpha >= beta or best_value == MAX_VALUE:
+            break
+
+    return best_value, best_move
+
+
+def negamax_search(board, previous_value=None):
+    """Searches the best move for the AI with `negamax`, using an aspiration
+    window around the value of its previous move.
+
+    If the value falls outside of the window, the board is searched again with
+    the full window. The value and movement are the same returned by
+    `minimax`.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board, with the AI to move.
+    previous_value : int, optional
+        The value of the previous move of the AI. If None, the full window is
+        used.
+
+    Returns
+    -------
+    board_value : int
+        The same value returned by `minimax`.
+    loc : tuple
+        The same movement returned by `minimax`.
+    """
+    if previous_value is not None:
+        alpha = previous_value - ASPIRATION_DELTA
+        beta = previous_value + ASPIRATION_DELTA
+        value, movement = negamax(board, 1, alpha, beta)
+        if alpha < value < beta:
+            return value, movement
+
+    return negamax(board)
+
+
 def expected_minimax(board, maxi=True, alpha=-INF, beta=INF):
     """The expected minimax algorithm. It receives a board and player to
     evaluate and will consider that the game has a 1/2 probability of each
@@ -221,21 +372,25 @@ def expected_minimax(board, maxi=True, alpha=-INF, beta=INF):
     loc : tuple
         The best possible movement in the position.
     """
+    global NODE_COUNT
+    NODE_COUNT += 1
+
     # If we've already computed this board for this player, than return the
     # calculated value and movement.
-    if (maxi, engine.hash_board(board)) in MEMO_BOARD:
-        return MEMO_BOARD[maxi, engine.hash_board(board)]
+    key = (AI_PIECE, maxi, engine.hash_board(board))
+    if key in MEMO_BOARD:
+        return MEMO_BOARD[key]
 
     game_over = is_game_over(board)
     # game over cases:
     if game_over == engine.DRAW_ID:  # draw
-        MEMO_BOARD[maxi, engine.hash_board(board)] = (0, NULL_MOVE)
+        MEMO_BOARD[key] = (0, NULL_MOVE)
         return 0, NULL_MOVE
     if game_over == AI_PIECE:  # ai wins
-        MEMO_BOARD[maxi, engine.hash_board(board)] = (1, NULL_MOVE)
+        MEMO_BOARD[key] = (1, NULL_MOVE)
         return 1, NULL_MOVE
     if game_over == PLAYER_PIECE:  # player wins
-        MEMO_BOARD[maxi, engine.hash_board(board)] = (-1, NULL_MOVE)
+        MEMO_BOARD[key] = (-1, NULL_MOVE)
         return -1, NULL_MOVE
 
     if maxi:
@@ -255,7 +410,7 @@ def expected_minimax(board, maxi=True, alpha=-INF, beta=INF):
             if alpha >= beta:
                 break
 
-        MEMO_BOARD[maxi, engine.hash_board(board)] = (maxi_value, best_move)
+        MEMO_BOARD[key] = (maxi_value, best_move)
         return maxi_value, best_move
     else:
         mini_value = INF
@@ -274,10 +429,206 @@ def expected_minimax(board, maxi=True, alpha=-INF, beta=INF):
             if alpha >= beta:
                 break
 
-        MEMO_BOARD[maxi, engine.hash_board(board)] = (mini_value, best_move)
+        MEMO_BOARD[key] = (mini_value, best_move)
         return mini_value, best_move
 
 
+def _chance_node(board, maxi, alpha, beta):
+    # The value of a move is the average of the board with each player to
+    # move. Knowing that every value is between MIN_VALUE and MAX_VALUE, the
+    # window of each child is narrowed so that the average is only computed
+    # if it falls inside (alpha, beta) (Ballard's Star1).
+    child_alpha = max(2 * alpha - MAX_VALUE, MIN_VALUE)
+    child_beta = min(2 * beta - MIN_VALUE, MAX_VALUE)
+    first_value = star_expected_minimax(board, maxi, child_alpha, child_beta)[0]
+
+    if first_value <= 2 * alpha - MAX_VALUE:
+        return (first_value + MAX_VALUE) / 2
+    if first_value >= 2 * beta - MIN_VALUE:
+        return (first_value + MIN_VALUE) / 2
+
+    child_alpha = max(2 * alpha - first_value, MIN_VALUE)
+    child_beta = min(2 * beta - first_value, MAX_VALUE)
+    second_value = star_expected_minimax(board, not maxi, child_alpha, child_beta)[0]
+
+    return (first_value + second_value) / 2
+
+
+def star_expected_minimax(board, maxi=True, alpha=-INF, beta=INF):
+    """The expected minimax algorithm with alpha-beta pruning on the coin toss
+    (chance) nodes, in the style of Ballard's Star1.
+
+    The value and movement of the root are the same as the ones returned by
+    `expected_minimax` with the full window, but far fewer boards are visited.
+    When a board is cut off, the value returned is only a bound: if it's
+    smaller than or equal to `alpha` the real value is not greater than it and
+    if it's greater than or equal to `beta` the real value is not smaller than
+    it. The values and bounds are memoized on the `MEMO_STAR` hashtable.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board
+    maxi : bool, default=True
+        If the AI is maximazim its gains or minimizing its loses.
+    alpha : float, default=-INF
+        The alpha value (referent to the alpha-beta pruning technic)
+    beta : float, default=INF
+        The beta value (referent to the alpha-beta pruning technic)
+
+    Returns
+    -------
+    board_value : float
+        The expected value of the board, between -1 and 1 (or a bound of it).
+    loc : tuple
+        The best possible movement in the position.
+    """
+    global NODE_COUNT
+    NODE_COUNT += 1
+
+    key = (AI_PIECE, maxi, engine.hash_board(board))
+    if key in MEMO_STAR:
+        value, best_move, kind = MEMO_STAR[key]
+        if (
+            kind == EXACT
+            or (kind == LOWER_BOUND and value >= beta)
+            or (kind == UPPER_BOUND and value <= alpha)
+        ):
+            return value, best_move
+
+    game_over = is_game_over(board)
+    # game over cases:
+    if game_over != engine.PIECE_EMPTY:
+        if game_over == AI_PIECE:
+            value = 1
+        elif game_over == PLAYER_PIECE:
+            value = -1
+        else:
+            value = 0
+        MEMO_STAR[key] = (value, NULL_MOVE, EXACT)
+        return value, NULL_MOVE
+
+    first_alpha, first_beta = alpha, beta
+    best_move = NULL_MOVE
+    if maxi:
+        best_value = -INF
+        for new_board, move in get_moves(board, AI_PIECE):
+            value = _chance_node(new_board, maxi, alpha, beta)
+            if value > best_value:
+                best_value = value
+                best_move = move
+
+            alpha = max(alpha, best_value)
+            if alpha >= beta:
+                break
+    else:
+        best_value = INF
+        for new_board, move in get_moves(board, PLAYER_PIECE):
+            value = _chance_node(new_board, maxi, alpha, beta)
+            if value < best_value:
+                best_value = value
+                best_move = move
+
+            beta = min(beta, best_value)
+            if alpha >= beta:
+                break
+
+    if best_value <= first_alpha:
+        kind = UPPER_BOUND
+    elif best_value >= first_beta:
+        kind = LOWER_BOUND
+    else:
+        kind = EXACT
+    MEMO_STAR[key] = (best_value, best_move, kind)
+    return best_value, best_move
+
+
+def exact_minimax(board, maxi=True):
+    """The minimax algorithm without pruning. The values returned are always
+    exact, so they are memoized on the `MEMO_EXACT` hashtable and shared by
+    every call.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board
+    maxi : bool, default=True
+        If the AI is maximazim its gains or minimizing its loses.
+
+    Returns
+    -------
+    board_value : int
+        0 if the position is a draw, 1 if it's winning for the AI and -1 if
+        it's losing for the AI.
+    """
+    key = (AI_PIECE, maxi, engine.hash_board(board))
+    if key in MEMO_EXACT:
+        return MEMO_EXACT[key]
+
+    game_over = is_game_over(board)
+    if game_over == engine.DRAW_ID:
+        board_value = 0
+    elif game_over == AI_PIECE:
+        board_value = 1
+    elif game_over == PLAYER_PIECE:
+        board_value = -1
+    elif maxi:
+        board_value = max(
+            exact_minimax(new_board, not maxi)
+            for new_board, _ in get_moves(board, AI_PIECE)
+        )
+    else:
+        board_value = min(
+            exact_minimax(new_board, not maxi)
+            for new_board, _ in get_moves(board, PLAYER_PIECE)
+        )
+
+    MEMO_EXACT[key] = board_value
+    return board_value
+
+
+def analyze(board, maxi=True, toss_turn=False):
+    """Evaluates every legal move of a position.
+
+    All the moves are evaluated by the same memoized search (`exact_minimax`
+    or `expected_minimax`), so the positions shared between them are only
+    searched once. The values are always from the AI's point of view.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board.
+    maxi : bool, default=True
+        If it's the AI's turn to move or the player's.
+    toss_turn : bool, default=False
+        If the turns will be based on a coin toss or not.
+
+    Returns
+    -------
+    evaluations : dict
+        Maps the location tuple of each legal move to its value: the exact
+        minimax value (-1, 0 or 1) or, if `toss_turn`, the expected value with
+        the coin toss. It's empty if the game is over.
+    """
+    if USE_JIT:
+        return jit.analyze(board, AI_PIECE, PLAYER_PIECE, maxi, toss_turn)
+
+    if is_game_over(board) != engine.PIECE_EMPTY:
+        return dict()
+
+    evaluations = dict()
+    piece = AI_PIECE if maxi else PLAYER_PIECE
+    for new_board, loc in get_moves(board, piece):
+        if toss_turn:
+            ai_next_ret = expected_minimax(new_board, True)
+            human_next_ret = expected_minimax(new_board, False)
+            evaluations[loc] = (ai_next_ret[0] + human_next_ret[0]) / 2
+        else:
+            evaluations[loc] = exact_minimax(new_board, not maxi)
+
+    return evaluations
+
+
 def move(board, toss_turn=False, verbose=False):
     """Function called when we want the AI to play. It puts a piece on the
     board and change the turn.
@@ -290,20 +641,42 @@ def move(board, toss_turn=False, verbose=False):
         If the turns will be based on a coin toss or not.
     verbose : bool, default=False
         If we want or not the AI to tell us its evaluation of the position.
+
+    Raises
+    ------
+    ValueError
+        if `ENGINE` isn't a known engine
     """
+    global PREVIOUS_VALUE
+
     if toss_turn:
-        value, movement = expected_minimax(board)
+        if USE_JIT:
+            value, movement = jit.expected_minimax(board, AI_PIECE, PLAYER_PIECE)
+        else:
+            value, movement = star_expected_minimax(board)
 
         if verbose:
             print(f"[AI]: Moving {movement}.")
             print(f"[AI]: My chances of winning are {value}.")
     else:
-        value, movement = minimax(board)
+        search_engine = ENGINE
+        if search_engine is None:
+            search_engine = "jit" if USE_JIT else "minimax"
+
+        if search_engine == "jit":
+            value, movement = jit.minimax(board, AI_PIECE, PLAYER_PIECE)
+        elif search_engine == "negamax":
+            value, movement = negamax_search(board, PREVIOUS_VALUE)
+        elif search_engine == "minimax":
+            value, movement = minimax(board)
+        else:
+            raise ValueError(f"Unknown engine {search_engine}.")
 
         if verbose:
             value_to_str = {-1: "Losing game", 0: "Game tied", 1: "Winning game"}
             print(f"[AI]: {value_to_str[value]}")
 
+    PREVIOUS_VALUE = value
     engine.put_piece(AI_PIECE, movement)
     changed = engine.change_turn(toss_turn)
 
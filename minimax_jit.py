@@ -0,0 +1,563 @@
+"""This module implements a compiled version of the minimax search kernel.
+
+The board is flattened into an array of 9 squares (row-major, the same order
+used by `minimax.get_moves` and `engine.hash_board`) and the searches are
+compiled with Numba when it is installed. The searches are loops over
+explicit stacks instead of recursive functions, so the machine code is cached
+on disk and only compiled by the first run. If Numba isn't available, the
+functions still work as plain Python, but `AVAILABLE` is False and the
+`minimax` module keeps using its own implementation.
+"""
+
+import numpy as np
+
+import game_engine as engine
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+""" If the compiled kernel can be used """
+
+NULL_SQUARE = -1
+""" A constant for a null movement on the flat board """
+
+N_BOARDS = 3**9
+""" The number of possible hashes of a board """
+
+MAX_DEPTH = 10
+""" The size of the stacks of the searches: a game has at most 9 moves, so
+there are at most 10 boards on the path from the root """
+
+LINES = np.array(
+    [
+        [0, 1, 2],
+        [3, 4, 5],
+        [6, 7, 8],
+        [0, 3, 6],
+        [1, 4, 7],
+        [2, 5, 8],
+        [0, 4, 8],
+        [2, 4, 6],
+    ],
+    dtype=np.int64,
+)
+""" The squares of each winning line, in the same order that
+`minimax.is_game_over` checks them (rows, columns, main and off diagonal) """
+
+MEMO_VALUE = np.zeros((3, 2, N_BOARDS), dtype=np.float64)
+""" Memoization table of `expected_minimax`, indexed by
+`[ai_piece, maxi, hash]` """
+MEMO_MOVE = np.full((3, 2, N_BOARDS), NULL_SQUARE, dtype=np.int64)
+""" The best square stored with each entry of `MEMO_VALUE` """
+MEMO_SET = np.zeros((3, 2, N_BOARDS), dtype=np.bool_)
+""" If an entry of `MEMO_VALUE` was already computed """
+
+EXACT_VALUE = np.zeros((3, 2, N_BOARDS), dtype=np.int64)
+""" Memoization table of `exact_minimax`, indexed by `[ai_piece, maxi, hash]` """
+EXACT_SET = np.zeros((3, 2, N_BOARDS), dtype=np.bool_)
+""" If an entry of `EXACT_VALUE` was already computed """
+
+
+def _jit(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+
+@_jit
+def _is_game_over(board, lines):
+    for line in range(lines.shape[0]):
+        first = board[lines[line, 0]]
+        if (
+            first != engine.PIECE_EMPTY
+            and board[lines[line, 1]] == first
+            and board[lines[line, 2]] == first
+        ):
+            return first
+
+    for square in range(9):
+        if board[square] == engine.PIECE_EMPTY:
+            return engine.PIECE_EMPTY
+
+    return engine.DRAW_ID
+
+
+@_jit
+def _hash(board):
+    hash_num = 0
+    power = 1
+    for square in range(9):
+        hash_num += board[square] * power
+        power *= 3
+    return hash_num
+
+
+@_jit
+def _terminal_value(game_over, ai_piece):
+    if game_over == engine.DRAW_ID:
+        return 0
+    if game_over == ai_piece:
+        return 1
+    return -1
+
+
+# The searches below keep the path from the root to the current board on
+# explicit stacks, indexed by the depth, instead of calling themselves: Numba
+# can't load the cached machine code of recursive functions. `has_value` means
+# that `value` is the result of the child being searched by the board at
+# `depth`.
+
+
+@_jit
+def _minimax(board, maxi, alpha, beta, ai_piece, player_piece, lines):
+    game_over = _is_game_over(board, lines)
+    if game_over != engine.PIECE_EMPTY:
+        return _terminal_value(game_over, ai_piece), NULL_SQUARE
+
+    maxis = np.zeros(MAX_DEPTH, dtype=np.bool_)
+    alphas = np.zeros(MAX_DEPTH, dtype=np.int64)
+    betas = np.zeros(MAX_DEPTH, dtype=np.int64)
+    best_values = np.zeros(MAX_DEPTH, dtype=np.int64)
+    best_moves = np.zeros(MAX_DEPTH, dtype=np.int64)
+    squares = np.zeros(MAX_DEPTH, dtype=np.int64)
+
+    depth = 0
+    maxis[0], alphas[0], betas[0] = maxi, alpha, beta
+    best_values[0] = -2 if maxi else 2
+    best_moves[0] = NULL_SQUARE
+    squares[0] = -1
+    cut = False
+    has_value = False
+    value = 0
+    while True:
+        if has_value:
+            has_value = False
+            board[squares[depth]] = engine.PIECE_EMPTY
+            if maxis[depth]:
+                if value > best_values[depth]:
+                    best_values[depth] = value
+                    best_moves[depth] = squares[depth]
+                alphas[depth] = max(alphas[depth], best_values[depth])
+            else:
+                if value < best_values[depth]:
+                    best_values[depth] = value
+                    best_moves[depth] = squares[depth]
+                betas[depth] = min(betas[depth], best_values[depth])
+            cut = alphas[depth] >= betas[depth]
+
+        square = squares[depth] + 1
+        while square < 9 and board[square] != engine.PIECE_EMPTY:
+            square += 1
+        if cut or square == 9:
+            if depth == 0:
+                return best_values[0], best_moves[0]
+            value = best_values[depth]
+            depth -= 1
+            cut = False
+            has_value = True
+            continue
+
+        squares[depth] = square
+        board[square] = ai_piece if maxis[depth] else player_piece
+        game_over = _is_game_over(board, lines)
+        if game_over != engine.PIECE_EMPTY:
+            value = _terminal_value(game_over, ai_piece)
+            has_value = True
+            continue
+
+        depth += 1
+        maxis[depth] = not maxis[depth - 1]
+        alphas[depth], betas[depth] = alphas[depth - 1], betas[depth - 1]
+        best_values[depth] = -2 if maxis[depth] else 2
+        best_moves[depth] = NULL_SQUARE
+        squares[depth] = -1
+
+
+@_jit
+def _expected_minimax(
+    board, maxi, alpha, beta, ai_piece, player_piece, lines, values, moves, done
+):
+    key = _hash(board)
+    if done[int(maxi), key]:
+        return values[int(maxi), key], moves[int(maxi), key]
+
+    game_over = _is_game_over(board, lines)
+    if game_over != engine.PIECE_EMPTY:
+        values[int(maxi), key] = _terminal_value(game_over, ai_piece)
+        moves[int(maxi), key] = NULL_SQUARE
+        done[int(maxi), key] = True
+        return values[int(maxi), key], NULL_SQUARE
+
+    # Each move is followed by two children, one for each player to move, and
+    # `phases` counts how many of them were already searched.
+    maxis = np.zeros(MAX_DEPTH, dtype=np.bool_)
+    keys = np.zeros(MAX_DEPTH, dtype=np.int64)
+    alphas = np.zeros(MAX_DEPTH, dtype=np.float64)
+    betas = np.zeros(MAX_DEPTH, dtype=np.float64)
+    best_values = np.zeros(MAX_DEPTH, dtype=np.float64)
+    best_moves = np.zeros(MAX_DEPTH, dtype=np.int64)
+    squares = np.zeros(MAX_DEPTH, dtype=np.int64)
+    phases = np.zeros(MAX_DEPTH, dtype=np.int64)
+    first_values = np.zeros(MAX_DEPTH, dtype=np.float64)
+
+    depth = 0
+    maxis[0], keys[0], alphas[0], betas[0] = maxi, key, alpha, beta
+    best_values[0] = -2.0 if maxi else 2.0
+    best_moves[0] = NULL_SQUARE
+    squares[0] = -1
+    cut = False
+    has_value = False
+    value = 0.0
+    while True:
+        if has_value:
+            has_value = False
+            if phases[depth] == 1:
+                first_values[depth] = value
+            else:
+                phases[depth] = 0
+                board[squares[depth]] = engine.PIECE_EMPTY
+                value = (first_values[depth] + value) / 2
+                if maxis[depth]:
+                    if value > best_values[depth]:
+                        best_values[depth] = value
+                        best_moves[depth] = squares[depth]
+                    alphas[depth] = max(alphas[depth], best_values[depth])
+                else:
+                    if value < best_values[depth]:
+                        best_values[depth] = value
+                        best_moves[depth] = squares[depth]
+                    betas[depth] = min(betas[depth], best_values[depth])
+                cut = alphas[depth] >= betas[depth]
+
+        if phases[depth] == 0:
+            square = squares[depth] + 1
+            while square < 9 and board[square] != engine.PIECE_EMPTY:
+                square += 1
+            if cut or square == 9:
+                values[int(maxis[depth]), keys[depth]] = best_values[depth]
+                moves[int(maxis[depth]), keys[depth]] = best_moves[depth]
+                done[int(maxis[depth]), keys[depth]] = True
+                if depth == 0:
+                    return best_values[0], best_moves[0]
+                value = best_values[depth]
+                depth -= 1
+                cut = False
+                has_value = True
+                continue
+
+            squares[depth] = square
+            board[square] = ai_piece if maxis[depth] else player_piece
+            child_maxi = maxis[depth]
+        else:
+            child_maxi = not maxis[depth]
+        phases[depth] += 1
+
+        child_key = _hash(board)
+        if done[int(child_maxi), child_key]:
+            value = values[int(child_maxi), child_key]
+            has_value = True
+            continue
+
+        game_over = _is_game_over(board, lines)
+        if game_over != engine.PIECE_EMPTY:
+            value = _terminal_value(game_over, ai_piece)
+            values[int(child_maxi), child_key] = value
+            moves[int(child_maxi), child_key] = NULL_SQUARE
+            done[int(child_maxi), child_key] = True
+            has_value = True
+            continue
+
+        depth += 1
+        maxis[depth], keys[depth] = child_maxi, child_key
+        alphas[depth], betas[depth] = -2.0, 2.0
+        best_values[depth] = -2.0 if child_maxi else 2.0
+        best_moves[depth] = NULL_SQUARE
+        squares[depth] = -1
+        phases[depth] = 0
+
+
+@_jit
+def _exact_minimax(board, maxi, ai_piece, player_piece, lines, values, done):
+    key = _hash(board)
+    if done[int(maxi), key]:
+        return values[int(maxi), key]
+
+    game_over = _is_game_over(board, lines)
+    if game_over != engine.PIECE_EMPTY:
+        values[int(maxi), key] = _terminal_value(game_over, ai_piece)
+        done[int(maxi), key] = True
+        return values[int(maxi), key]
+
+    maxis = np.zeros(MAX_DEPTH, dtype=np.bool_)
+    keys = np.zeros(MAX_DEPTH, dtype=np.int64)
+    best_values = np.zeros(MAX_DEPTH, dtype=np.int64)
+    squares = np.zeros(MAX_DEPTH, dtype=np.int64)
+
+    depth = 0
+    maxis[0], keys[0] = maxi, key
+    best_values[0] = -2 if maxi else 2
+    squares[0] = -1
+    has_value = False
+    value = 0
+    while True:
+        if has_value:
+            has_value = False
+            board[squares[depth]] = engine.PIECE_EMPTY
+            if maxis[depth]:
+                best_values[depth] = max(best_values[depth], value)
+            else:
+                best_values[depth] = min(best_values[depth], value)
+
+        square = squares[depth] + 1
+        while square < 9 and board[square] != engine.PIECE_EMPTY:
+            square += 1
+        if square == 9:
+            values[int(maxis[depth]), keys[depth]] = best_values[depth]
+            done[int(maxis[depth]), keys[depth]] = True
+            if depth == 0:
+                return best_values[0]
+            value = best_values[depth]
+            depth -= 1
+            has_value = True
+            continue
+
+        squares[depth] = square
+        board[square] = ai_piece if maxis[depth] else player_piece
+        child_maxi = not maxis[depth]
+        child_key = _hash(board)
+        if done[int(child_maxi), child_key]:
+            value = values[int(child_maxi), child_key]
+            has_value = True
+            continue
+
+        game_over = _is_game_over(board, lines)
+        if game_over != engine.PIECE_EMPTY:
+            value = _terminal_value(game_over, ai_piece)
+            values[int(child_maxi), child_key] = value
+            done[int(child_maxi), child_key] = True
+            has_value = True
+            continue
+
+        depth += 1
+        maxis[depth], keys[depth] = child_maxi, child_key
+        best_values[depth] = -2 if child_maxi else 2
+        squares[depth] = -1
+
+
+@_jit
+def _analyze(
+    board,
+    maxi,
+    toss_turn,
+    ai_piece,
+    player_piece,
+    lines,
+    exact_values,
+    exact_done,
+    values,
+    moves,
+    done,
+    evaluations,
+):
+    piece = ai_piece if maxi else player_piece
+    for square in range(9):
+        if board[square] != engine.PIECE_EMPTY:
+            continue
+        board[square] = piece
+        if toss_turn:
+            ai_next, _ = _expected_minimax(
+                board,
+                True,
+                -2.0,
+                2.0,
+                ai_piece,
+                player_piece,
+                lines,
+                values,
+                moves,
+                done,
+            )
+            human_next, _ = _expected_minimax(
+                board,
+                False,
+                -2.0,
+                2.0,
+                ai_piece,
+                player_piece,
+                lines,
+                values,
+                moves,
+                done,
+            )
+            evaluations[square] = (ai_next + human_next) / 2
+        else:
+            evaluations[square] = _exact_minimax(
+                board,
+                not maxi,
+                ai_piece,
+                player_piece,
+                lines,
+                exact_values,
+                exact_done,
+            )
+        board[square] = engine.PIECE_EMPTY
+
+
+def _square_to_loc(square):
+    if square == NULL_SQUARE:
+        return (-1, -1)
+    return (int(square) // 3, int(square) % 3)
+
+
+def minimax(board, ai_piece, player_piece, maxi=True, alpha=-2, beta=2):
+    """The compiled version of `minimax.minimax`.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board (3x3). It's not modified.
+    ai_piece : const
+        The piece of the maximizing player.
+    player_piece : const
+        The piece of the minimizing player.
+    maxi : bool, default=True
+        If the AI is maximazim its gains or minimizing its loses.
+    alpha : int, default=-2
+        The alpha value (referent to the alpha-beta pruning technic)
+    beta : int, default=2
+        The beta value (referent to the alpha-beta pruning technic)
+
+    Returns
+    -------
+    board_value : int
+        The same value returned by `minimax.minimax`.
+    loc : tuple
+        The same movement returned by `minimax.minimax`.
+    """
+    flat = np.ascontiguousarray(board, dtype=np.int64).reshape(9).copy()
+    value, square = _minimax(flat, maxi, alpha, beta, ai_piece, player_piece, LINES)
+    return int(value), _square_to_loc(square)
+
+
+def expected_minimax(board, ai_piece, player_piece, maxi=True, alpha=-2, beta=2):
+    """The compiled version of `minimax.expected_minimax`.
+
+    The memoization lives in `MEMO_VALUE`, `MEMO_MOVE` and `MEMO_SET`, which
+    are kept separately for each AI piece.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board (3x3). It's not modified.
+    ai_piece : const
+        The piece of the maximizing player.
+    player_piece : const
+        The piece of the minimizing player.
+    maxi : bool, default=True
+        If the AI is maximazim its gains or minimizing its loses.
+    alpha : int, default=-2
+        The alpha value (referent to the alpha-beta pruning technic)
+    beta : int, default=2
+        The beta value (referent to the alpha-beta pruning technic)
+
+    Returns
+    -------
+    board_value : float
+        The same value returned by `minimax.expected_minimax`.
+    loc : tuple
+        The same movement returned by `minimax.expected_minimax`.
+    """
+    flat = np.ascontiguousarray(board, dtype=np.int64).reshape(9).copy()
+    value, square = _expected_minimax(
+        flat,
+        maxi,
+        float(alpha),
+        float(beta),
+        ai_piece,
+        player_piece,
+        LINES,
+        MEMO_VALUE[ai_piece],
+        MEMO_MOVE[ai_piece],
+        MEMO_SET[ai_piece],
+    )
+    return float(value), _square_to_loc(square)
+
+
+def analyze(board, ai_piece, player_piece, maxi=True, toss_turn=False):
+    """The compiled version of `minimax.analyze`.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board (3x3). It's not modified.
+    ai_piece : const
+        The piece of the maximizing player.
+    player_piece : const
+        The piece of the minimizing player.
+    maxi : bool, default=True
+        If it's the AI's turn to move or the player's.
+    toss_turn : bool, default=False
+        If the turns will be based on a coin toss or not.
+
+    Returns
+    -------
+    evaluations : dict
+        The same dictionary returned by `minimax.analyze`.
+    """
+    flat = np.ascontiguousarray(board, dtype=np.int64).reshape(9).copy()
+    if _is_game_over(flat, LINES) != engine.PIECE_EMPTY:
+        return dict()
+
+    evaluations = np.zeros(9, dtype=np.float64)
+    _analyze(
+        flat,
+        maxi,
+        toss_turn,
+        ai_piece,
+        player_piece,
+        LINES,
+        EXACT_VALUE[ai_piece],
+        EXACT_SET[ai_piece],
+        MEMO_VALUE[ai_piece],
+        MEMO_MOVE[ai_piece],
+        MEMO_SET[ai_piece],
+        evaluations,
+    )
+
+    convert = float if toss_turn else int
+    return {
+        _square_to_loc(square): convert(evaluations[square])
+        for square in range(9)
+        if flat[square] == engine.PIECE_EMPTY
+    }
+
+
+def warm_up():
+    """Compiles the kernels (or loads them from the cache on disk), so it
+    doesn't happen on the first move or hint.
+
+    The kernels are called on a board with a single empty square, so almost
+    nothing is searched.
+    """
+    if not AVAILABLE:
+        return
+
+    board = np.array(
+        [
+            [engine.PIECE_X, engine.PIECE_O, engine.PIECE_X],
+            [engine.PIECE_X, engine.PIECE_O, engine.PIECE_O],
+            [engine.PIECE_O, engine.PIECE_X, engine.PIECE_EMPTY],
+        ]
+    )
+    minimax(board, engine.PIECE_X, engine.PIECE_O)
+    expected_minimax(board, engine.PIECE_X, engine.PIECE_O)
+    analyze(board, engine.PIECE_X, engine.PIECE_O)
+
+
+def clear_memo():
+    """Forgets every position stored by `expected_minimax` and `analyze`."""
+    MEMO_SET[:] = False
+    EXACT_SET[:] = False
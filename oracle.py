@@ -0,0 +1,409 @@
+"""This module is a differential oracle for the search engines.
+
+It enumerates every reachable position of the game, for both AI pieces and
+with and without the coin toss, and checks that every candidate engine agrees
+with the reference implementation: `minimax.minimax`,
+`minimax.expected_minimax` and `game_engine.is_game_over`. The values must be
+the same and the moves must be one of the best moves of the reference (any of
+them, if there's a tie), found by the reference search on the board after each
+move. The engines that evaluate every move (`minimax.analyze` and its compiled
+version) must give each move exactly that value. The time of every engine on
+every position is recorded.
+
+The positions are split among a pool of processes. Run it with
+`$ python oracle.py`; it exits with an error if any engine disagrees with the
+reference or if it takes more than `--max-seconds`.
+"""
+
+import argparse
+import csv
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+import game_engine as engine
+import minimax as ai
+import minimax_jit as jit
+import pn_search
+
+CHUNKS_PER_PROCESS = 4
+""" How many jobs each process receives, on average, for each mode """
+
+
+def _next_pieces(board, toss_turn):
+    if toss_turn:
+        return (engine.PIECE_X, engine.PIECE_O)
+    n_x = np.count_nonzero(board == engine.PIECE_X)
+    n_o = np.count_nonzero(board == engine.PIECE_O)
+    return (engine.PIECE_X,) if n_x == n_o else (engine.PIECE_O,)
+
+
+def reachable_positions(toss_turn=False):
+    """Returns all the boards that can happen in a game.
+
+    Parameters
+    ----------
+    toss_turn : bool, default=False
+        If the turns are based on a coin toss (any player may move at any
+        turn) or if they alternate, starting with X.
+
+    Returns
+    -------
+    hashes : list
+        The sorted hash values (see `engine.hash_board`) of the boards,
+        including the ones where the game is over.
+    """
+    empty = engine.hash_board(np.full((3, 3), engine.PIECE_EMPTY, dtype=int))
+    seen = {empty}
+    frontier = [empty]
+    while frontier:
+        hash_num = frontier.pop()
+        board = engine.unhash_board(hash_num)
+        if ai.is_game_over(board) != engine.PIECE_EMPTY:
+            continue
+        for piece_type in _next_pieces(board, toss_turn):
+            for new_board, _ in ai.get_moves(board, piece_type):
+                new_hash = engine.hash_board(new_board)
+                if new_hash not in seen:
+                    seen.add(new_hash)
+                    frontier.append(new_hash)
+    return sorted(int(hash_num) for hash_num in seen)
+
+
+def _negamax(board, maxi):
+    value, movement = ai.negamax(board, 1 if maxi else -1)
+    return (value if maxi else -value), movement
+
+
+def _pn_search(board, maxi):
+    mover = ai.AI_PIECE if maxi else ai.PLAYER_PIECE
+    value = pn_search.solve_as_minimax(board, mover)
+    return (value if maxi else -value), None
+
+
+def _jit_minimax(board, maxi):
+    return jit.minimax(board, ai.AI_PIECE, ai.PLAYER_PIECE, maxi)
+
+
+def _star_expected(board, maxi):
+    return ai.star_expected_minimax(board, maxi)
+
+
+def _jit_expected(board, maxi):
+    return jit.expected_minimax(board, ai.AI_PIECE, ai.PLAYER_PIECE, maxi)
+
+
+def _jit_analyze(board, maxi, toss_turn):
+    return jit.analyze(board, ai.AI_PIECE, ai.PLAYER_PIECE, maxi, toss_turn)
+
+
+def _jit_game_over(board):
+    flat = np.ascontiguousarray(board, dtype=np.int64).reshape(9)
+    return jit._is_game_over(flat, jit.LINES)
+
+
+def _engine_game_over(board):
+    engine.BOARD = board
+    engine.MOVEMENTS_LEFT = int(np.count_nonzero(board == engine.PIECE_EMPTY))
+    return engine.is_game_over()
+
+
+def get_candidates():
+    """Returns the engines checked against the reference of each mode.
+
+    Returns
+    -------
+    candidates : dict
+        Maps "minimax", "expected" and "game_over" to lists of
+        `(name, function)` pairs. The first pair is the reference. For the
+        first two modes, the functions receive a board and `maxi` and return
+        a `(value, loc)` tuple (`loc` may be None if the engine only finds
+        the value); for "game_over" they receive a board and return the
+        winner like `engine.is_game_over`. It also maps "analyze" to the
+        engines that evaluate every move, which receive a board, `maxi` and
+        `toss_turn` and are checked against `reference_evaluations` in both
+        modes.
+    """
+    candidates = {
+        "minimax": [
+            ("minimax", ai.minimax),
+            ("negamax", _negamax),
+            ("pn_search", _pn_search),
+        ],
+        "expected": [
+            ("expected_minimax", ai.expected_minimax),
+            ("star", _star_expected),
+        ],
+        "game_over": [
+            ("is_game_over", _engine_game_over),
+            ("minimax", ai.is_game_over),
+            ("get_winner", engine.get_winner),
+        ],
+        "analyze": [("analyze", ai.analyze)],
+    }
+    if jit.AVAILABLE:
+        candidates["minimax"].append(("jit", _jit_minimax))
+        candidates["expected"].append(("jit", _jit_expected))
+        candidates["game_over"].append(("jit", _jit_game_over))
+        candidates["analyze"].append(("jit_analyze", _jit_analyze))
+    return candidates
+
+
+def reference_evaluations(board, maxi, toss_turn):
+    """Evaluates every legal move with the reference searches.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The current board. The game must not be over.
+    maxi : bool
+        If it's the AI's turn to move or the player's.
+    toss_turn : bool
+        If the turns are based on a coin toss.
+
+    Returns
+    -------
+    evaluations : dict
+        Maps each legal location tuple to the value of `minimax.minimax` on
+        the board after it or, if `toss_turn`, to the mean of the values of
+        `minimax.expected_minimax` for each player to move next. This is what
+        `minimax.analyze` must return.
+    """
+    evaluations = dict()
+    piece = ai.AI_PIECE if maxi else ai.PLAYER_PIECE
+    for new_board, loc in ai.get_moves(board, piece):
+        if toss_turn:
+            ai_next = ai.expected_minimax(new_board, True)[0]
+            human_next = ai.expected_minimax(new_board, False)[0]
+            evaluations[loc] = (ai_next + human_next) / 2
+        else:
+            evaluations[loc] = ai.minimax(new_board, not maxi)[0]
+    return evaluations
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _check_game_over(hashes):
+    mismatches = []
+    timings = []
+    functions = get_candidates()["game_over"]
+    for hash_num in hashes:
+        board = engine.unhash_board(hash_num)
+        reference = None
+        for name, function in functions:
+            result, elapsed = _timed(function, board)
+            timings.append(("game_over", None, hash_num, None, name, elapsed))
+            if reference is None:
+                reference = result
+            elif result != reference:
+                mismatches.append(
+                    ("game_over", None, hash_num, None, name, result, reference)
+                )
+    return mismatches, timings
+
+
+def _check_search(mode, ai_piece, hashes):
+    ai.set_ai_piece(ai_piece)
+
+    toss_turn = mode == "expected"
+    mismatches = []
+    timings = []
+    candidates = get_candidates()
+    for hash_num in hashes:
+        board = engine.unhash_board(hash_num)
+        if ai.is_game_over(board) != engine.PIECE_EMPTY:
+            continue
+
+        for piece_type in _next_pieces(board, toss_turn):
+            maxi = piece_type == ai_piece
+            evaluations = reference_evaluations(board, maxi, toss_turn)
+            reference = None
+            for name, function in candidates[mode]:
+                (value, loc), elapsed = _timed(function, board, maxi)
+                timings.append((mode, ai_piece, hash_num, maxi, name, elapsed))
+
+                if reference is None:
+                    reference = value
+                    best_moves = {
+                        loc
+                        for loc, move_value in evaluations.items()
+                        if move_value == value
+                    }
+                if value != reference or (loc is not None and loc not in best_moves):
+                    mismatches.append(
+                        (mode, ai_piece, hash_num, maxi, name, (value, loc), reference)
+                    )
+
+            for name, function in candidates["analyze"]:
+                result, elapsed = _timed(function, board, maxi, toss_turn)
+                timings.append((mode, ai_piece, hash_num, maxi, name, elapsed))
+                if result != evaluations:
+                    mismatches.append(
+                        (mode, ai_piece, hash_num, maxi, name, result, evaluations)
+                    )
+    return mismatches, timings
+
+
+def _run_job(job):
+    mode, ai_piece, hashes = job
+    if mode == "game_over":
+        return _check_game_over(hashes)
+    return _check_search(mode, ai_piece, hashes)
+
+
+def _init_worker():
+    # The reference must always be the Python implementation.
+    ai.USE_JIT = False
+
+
+def get_jobs(processes):
+    """Splits the positions in jobs for the pool of processes.
+
+    Parameters
+    ----------
+    processes : int
+        The number of processes of the pool.
+
+    Returns
+    -------
+    jobs : list
+        A list of tuples `(mode, ai_piece, hashes)`.
+    """
+    positions = {
+        False: reachable_positions(toss_turn=False),
+        True: reachable_positions(toss_turn=True),
+    }
+    # The positions are interleaved among the jobs, so that the slow ones
+    # (with few pieces) are spread among them.
+    n_chunks = max(processes * CHUNKS_PER_PROCESS, 1)
+
+    jobs = []
+    for mode, toss_turn in (("minimax", False), ("expected", True)):
+        for ai_piece in (engine.PIECE_X, engine.PIECE_O):
+            for i in range(n_chunks):
+                jobs.append((mode, ai_piece, positions[toss_turn][i::n_chunks]))
+
+    for i in range(n_chunks):
+        jobs.append(("game_over", None, positions[True][i::n_chunks]))
+
+    return jobs
+
+
+def run(processes=None):
+    """Runs the oracle over every reachable position.
+
+    Parameters
+    ----------
+    processes : int, optional
+        The number of processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    mismatches : list
+        One tuple `(mode, ai_piece, hash, maxi, engine, result, reference)`
+        for each disagreement.
+    timings : list
+        One tuple `(mode, ai_piece, hash, maxi, engine, seconds)` for each
+        engine on each position.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    mismatches = []
+    timings = []
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        for job_mismatches, job_timings in pool.imap_unordered(
+            _run_job, get_jobs(processes)
+        ):
+            mismatches += job_mismatches
+            timings += job_timings
+    return mismatches, timings
+
+
+def print_report(mismatches, timings):
+    """Prints the number of positions, the time and the disagreements of each
+    engine.
+
+    Parameters
+    ----------
+    mismatches : list
+        The mismatches returned by `run`.
+    timings : list
+        The timings returned by `run`.
+    """
+    totals = dict()
+    for mode, _, hash_num, _, name, elapsed in timings:
+        count, total, slowest, slowest_hash = totals.get((mode, name), (0, 0.0, 0.0, 0))
+        if elapsed > slowest:
+            slowest, slowest_hash = elapsed, hash_num
+        totals[mode, name] = (count + 1, total + elapsed, slowest, slowest_hash)
+
+    errors = dict()
+    for mode, _, _, _, name, _, _ in mismatches:
+        errors[mode, name] = errors.get((mode, name), 0) + 1
+
+    print(
+        f"{'mode':>10} {'engine':>17} {'checks':>8} {'total s':>9} "
+        f"{'mean us':>9} {'max us':>9} {'errors':>7}"
+    )
+    for (mode, name), (count, total, slowest, slowest_hash) in totals.items():
+        print(
+            f"{mode:>10} {name:>17} {count:8d} {total:9.2f} "
+            f"{total / count * 1e6:9.1f} {slowest * 1e6:9.1f} "
+            f"{errors.get((mode, name), 0):7d}"
+        )
+
+    for mismatch in mismatches[:20]:
+        mode, ai_piece, hash_num, maxi, name, result, reference = mismatch
+        print(
+            f"\n[{mode}] {name} returned {result} instead of {reference} "
+            f"(ai_piece={ai_piece}, maxi={maxi}):"
+        )
+        print(engine.unhash_board(hash_num))
+
+
+def save_timings(timings, path):
+    """Saves the time of every engine on every position as a CSV file.
+
+    Parameters
+    ----------
+    timings : list
+        The timings returned by `run`.
+    path : str
+        The path of the CSV file.
+    """
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["mode", "ai_piece", "hash", "maxi", "engine", "seconds"])
+        writer.writerows(timings)
+
+
+def main():
+    """Runs the oracle from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--timings", help="CSV file to save the timings")
+    parser.add_argument("--max-seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    mismatches, timings = run(args.processes)
+    elapsed = time.perf_counter() - start
+
+    print_report(mismatches, timings)
+    if args.timings:
+        save_timings(timings, args.timings)
+
+    print(f"\n{len(mismatches)} mismatches in {elapsed:.1f} s.")
+    if mismatches or elapsed > args.max_seconds:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
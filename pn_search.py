@@ -0,0 +1,374 @@
+"""This module implements a depth-first proof-number search (df-pn) solver.
+
+It decides if a position of the k-in-a-row game on a board of any size is a
+win, a loss or a draw, using the lines of `engine.get_lines` to detect the
+wins. Proving a win only needs one good move for the attacker and disproving
+it only needs one good defense, so it's able to solve boards where the full
+minimax is hopeless.
+
+The proof and disproof numbers are kept in `TABLE`, shared by symmetric
+boards, which is bounded by `MAX_ENTRIES`. When it's full, the half of the
+entries that took less work to compute is forgotten, except the ones of the
+positions on the path being searched and of their children.
+"""
+
+import operator
+import time
+
+import numpy as np
+
+import game_engine as engine
+import minimax as ai
+
+PN_INF = 10**9
+""" A constant for an infinite proof or disproof number """
+
+MAX_ENTRIES = 1_000_000
+""" The maximum number of positions kept on `TABLE`, unless the positions on
+the search path and their children need more. Each entry takes about 200
+bytes. Smaller tables make the search revisit the forgotten positions: the
+empty 4x4 board with k=3 stores about 660 positions and it takes 1.7x the
+nodes with 300 entries and 3x with 30 """
+
+TABLE = dict()
+""" The transposition table, it's keys are `bytes` with the smallest of the
+symmetric flat boards followed by the player to move and it's values are tuples
+`(phi, delta, work)`. `phi` and `delta` are the proof and disproof numbers of
+the goal of the player to move and `work` is the number of nodes spent on the
+position """
+
+NODE_COUNT = 0
+""" The number of positions expanded by the search """
+
+_LINES = []
+""" For each square of the flat board, the lines that go through it, as
+tuples of flat indices """
+
+_SYMMETRIES = []
+""" For each symmetry of the board, a function that maps the flat board to the
+squares of the symmetric board """
+
+_PATH = []
+""" For each position being searched by `_mid`, from the root to the current
+one, a list with its key and the keys of its children. These entries are
+never forgotten by the garbage collection """
+
+_ATTACKER = engine.PIECE_X
+""" The player trying to win in the current search. The other one (the
+defender) is trying to draw or win """
+
+
+def _set_lines(rows, columns, k):
+    global _LINES, _SYMMETRIES
+
+    squares = np.arange(rows * columns).reshape(rows, columns)
+    transforms = [squares, squares[::-1], squares[:, ::-1], squares[::-1, ::-1]]
+    if rows == columns:
+        transforms += [transform.T for transform in transforms]
+    _SYMMETRIES = [operator.itemgetter(*t.reshape(-1).tolist()) for t in transforms]
+
+    _LINES = [[] for _ in range(rows * columns)]
+    for line in engine.get_lines(rows, columns, k):
+        squares = tuple(i * columns + j for i, j in line)
+        for square in squares:
+            _LINES[square].append(squares)
+
+
+def _makes_line(board, square, piece_type):
+    for line in _LINES[square]:
+        if all(board[other] == piece_type for other in line):
+            return True
+    return False
+
+
+def _key(board, mover):
+    # Symmetric boards have the same value, so they share the same entry.
+    board = min(bytes(symmetry(board)) for symmetry in _SYMMETRIES)
+    return board + bytes([mover])
+
+
+def _lookup(key):
+    entry = TABLE.get(key)
+    if entry is None:
+        return 1, 1
+    return entry[0], entry[1]
+
+
+def _collect_garbage():
+    # Forgets the half of the table that was cheaper to compute, keeping the
+    # positions on the search path and their children.
+    kept = {key for keys in _PATH for key in keys}
+    entries = sorted(
+        (item for item in TABLE.items() if item[0] not in kept),
+        key=lambda item: item[1][2],
+    )
+    for key, _ in entries[: len(TABLE) // 2]:
+        del TABLE[key]
+
+
+def _store(key, phi, delta, work):
+    if key not in TABLE and len(TABLE) >= MAX_ENTRIES:
+        _collect_garbage()
+    TABLE[key] = (phi, delta, work)
+
+
+def _terminal_value(board, square, mover, empties):
+    # The (phi, delta) of the board after `mover` played on `square`, from the
+    # point of view of the opponent (the next to move), or None if the game
+    # isn't over.
+    if _makes_line(board, square, mover):
+        return PN_INF, 0
+    if empties == 0:
+        # A draw is a success only for the defender.
+        if engine.get_opponent(mover) == _ATTACKER:
+            return PN_INF, 0
+        return 0, PN_INF
+    return None
+
+
+def _children(board, mover, empties):
+    children = []
+    for square in range(len(board)):
+        if board[square] != engine.PIECE_EMPTY:
+            continue
+        board[square] = mover
+        terminal = _terminal_value(board, square, mover, empties - 1)
+        children.append((square, _key(board, engine.get_opponent(mover)), terminal))
+        board[square] = engine.PIECE_EMPTY
+    return children
+
+
+def _mid(board, mover, empties, threshold_phi, threshold_delta):
+    global NODE_COUNT
+
+    key = _key(board, mover)
+    phi, delta = _lookup(key)
+    if phi >= threshold_phi or delta >= threshold_delta:
+        return phi, delta
+
+    NODE_COUNT += 1
+    start = NODE_COUNT
+    children = _children(board, mover, empties)
+    _PATH.append([key] + [child[1] for child in children])
+
+    while True:
+        # The mover needs one child where the opponent fails (phi is the
+        # smallest delta of the children) and fails only if the opponent
+        # succeeds on every child (delta is the sum of their phi).
+        phi, delta = PN_INF, 0
+        second_delta = PN_INF
+        best = None
+        for child in children:
+            child_phi, child_delta = child[2] or _lookup(child[1])
+            delta = min(delta + child_phi, PN_INF)
+            if child_delta < phi:
+                second_delta = phi
+                phi = child_delta
+                best = (child[0], child_phi)
+            elif child_delta < second_delta:
+                second_delta = child_delta
+
+        if phi >= threshold_phi or delta >= threshold_delta:
+            _store(key, phi, delta, NODE_COUNT - start + 1)
+            _PATH.pop()
+            return phi, delta
+
+        square, best_phi = best
+        child_threshold_phi = min(threshold_delta - delta + best_phi, PN_INF)
+        child_threshold_delta = min(threshold_phi, second_delta + 1)
+
+        board[square] = mover
+        _mid(
+            board,
+            engine.get_opponent(mover),
+            empties - 1,
+            child_threshold_phi,
+            child_threshold_delta,
+        )
+        board[square] = engine.PIECE_EMPTY
+
+
+def _solved(board, mover, empties):
+    # The (phi, delta) of a board, searching it again if it was forgotten.
+    phi, delta = _lookup(_key(board, mover))
+    if phi != 0 and delta != 0:
+        phi, delta = _mid(board, mover, empties, PN_INF, PN_INF)
+    return phi, delta
+
+
+def _proved_child(board, mover, empties, children):
+    # The first child where the opponent fails, as proved by the search, or
+    # searched again if its entry was forgotten.
+    for child in children:
+        if (child[2] or _lookup(child[1]))[1] == 0:
+            return child
+
+    for child in children:
+        if child[2] is None and child[1] not in TABLE:
+            board[child[0]] = mover
+            _, child_delta = _solved(board, engine.get_opponent(mover), empties - 1)
+            board[child[0]] = engine.PIECE_EMPTY
+            if child_delta == 0:
+                return child
+    return None
+
+
+def _proof_size(board, mover, empties, succeeds, visited):
+    key = _key(board, mover)
+    if key in visited:
+        return 0
+    visited.add(key)
+
+    # If the mover succeeds, one child where the opponent fails is enough.
+    # If it fails, the opponent must succeed on every child.
+    children = _children(board, mover, empties)
+    if succeeds:
+        children = [_proved_child(board, mover, empties, children)]
+
+    size = 1
+    for square, child_key, terminal in children:
+        if terminal is None:
+            board[square] = mover
+            size += _proof_size(
+                board, engine.get_opponent(mover), empties - 1, not succeeds, visited
+            )
+            board[square] = engine.PIECE_EMPTY
+        elif child_key not in visited:
+            visited.add(child_key)
+            size += 1
+    return size
+
+
+def _search(board, mover, empties, attacker):
+    # Returns if the mover succeeds.
+    global _ATTACKER
+
+    _ATTACKER = attacker
+    TABLE.clear()
+    _PATH.clear()
+    phi, _ = _mid(board, mover, empties, PN_INF, PN_INF)
+    return phi == 0
+
+
+def solve(board, player_to_move, k=3):
+    """Decides if a position is won, lost or drawn.
+
+    The search is done twice if needed: first to prove that the player to
+    move wins and then to prove that the opponent wins. If none of them can
+    win, it's a draw.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        A matrix of any size where each position is one of PIECE_EMPTY,
+        PIECE_X or PIECE_O.
+    player_to_move : const
+        One of PIECE_X or PIECE_O.
+    k : int, default=3
+        How many pieces in a row are needed to win.
+
+    Returns
+    -------
+    winner_type : const
+        PIECE_X or PIECE_O if that player wins with perfect play or DRAW_ID if
+        it's a draw.
+    stats : dict
+        The statistics of the search: "nodes" (positions expanded by both
+        searches), "seconds", "nodes_per_second", "table_size" (at the end of
+        the last search), "proof_size" (the number of positions of the proof
+        or disproof tree of the last search) and "proof_nodes" (positions
+        expanded again to find the proof, if they were forgotten). Nothing is
+        searched if the game is already over.
+    """
+    global NODE_COUNT
+
+    NODE_COUNT = 0
+    start = time.perf_counter()
+
+    rows, columns = board.shape
+    _set_lines(rows, columns, k)
+    flat = bytearray(np.asarray(board, dtype=np.uint8).reshape(-1))
+    empties = flat.count(engine.PIECE_EMPTY)
+
+    winner_type = engine.get_winner(board, k)
+    succeeds = None
+    if winner_type == engine.PIECE_EMPTY:
+        opponent = engine.get_opponent(player_to_move)
+        succeeds = _search(flat, player_to_move, empties, player_to_move)
+        if succeeds:
+            winner_type = player_to_move
+        else:
+            succeeds = _search(flat, player_to_move, empties, opponent)
+            winner_type = engine.DRAW_ID if succeeds else opponent
+    else:
+        TABLE.clear()
+
+    elapsed = time.perf_counter() - start
+    nodes = NODE_COUNT
+    stats = {
+        "nodes": nodes,
+        "seconds": elapsed,
+        "nodes_per_second": nodes / elapsed if elapsed > 0 else 0.0,
+        "table_size": len(TABLE),
+        "proof_size": 1,
+        "proof_nodes": 0,
+    }
+    if succeeds is not None:
+        # The proof is only measured after the statistics of the search.
+        stats["proof_size"] = _proof_size(
+            flat, player_to_move, empties, succeeds, set()
+        )
+        stats["proof_nodes"] = NODE_COUNT - nodes
+    return int(winner_type), stats
+
+
+def solve_as_minimax(board, player_to_move):
+    """Solves a 3x3 board and returns the value the `minimax` module would
+    give to it, with `ai.AI_PIECE` as the player to move.
+
+    Parameters
+    ----------
+    board : numpy ndarray
+        The 3x3 board.
+    player_to_move : const
+        One of PIECE_X or PIECE_O.
+
+    Returns
+    -------
+    board_value : int
+        1 if the player to move wins, 0 if it's a draw and -1 if it loses.
+    """
+    winner_type, _ = solve(board, player_to_move)
+    if winner_type == engine.DRAW_ID:
+        return 0
+    return 1 if winner_type == player_to_move else -1
+
+
+def main():
+    """Test function. Checks the 3x3 game against `minimax` and solves some
+    larger boards."""
+    board = np.full((3, 3), engine.PIECE_EMPTY, dtype=int)
+    ai.set_ai_piece(engine.PIECE_X)
+    assert solve_as_minimax(board, engine.PIECE_X) == ai.minimax(board)[0]
+
+    board[1, 1] = engine.PIECE_X
+    ai.set_ai_piece(engine.PIECE_O)
+    assert solve_as_minimax(board, engine.PIECE_O) == ai.minimax(board)[0]
+    print("3x3 matches minimax.")
+
+    for rows, columns, k in ((3, 3, 3), (4, 4, 3), (3, 5, 3), (4, 4, 4)):
+        board = np.full((rows, columns), engine.PIECE_EMPTY, dtype=int)
+        winner_type, stats = solve(board, engine.PIECE_X, k)
+        result = {engine.PIECE_X: "X wins", engine.PIECE_O: "O wins"}.get(
+            winner_type, "draw"
+        )
+        print(
+            f"{rows}x{columns} k={k}: {result}, {stats['nodes']} nodes in "
+            f"{stats['seconds']:.2f} s ({stats['nodes_per_second']:.0f} nodes/s), "
+            f"table size {stats['table_size']}, proof size {stats['proof_size']} "
+            f"({stats['proof_nodes']} nodes searched again)"
+        )
+
+
+if __name__ == "__main__":
+    main()
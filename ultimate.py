@@ -0,0 +1,551 @@
+"""This module implements the ultimate tic-tac-toe variant.
+
+The board has nine sub-boards. The square where a player moves decides the
+sub-board where the opponent must move next (if that sub-board is already
+won or full, the opponent may move on any sub-board). Winning a sub-board
+puts the player's piece on that square of the meta-board, and the game is
+won by getting three in a row on the meta-board.
+
+Each sub-board is encoded as two 9-bit masks (one for X, one for O), where
+the bit `3 * i + j` is the square `(i, j)`. The wins are looked up in a table
+built once with `engine.get_winner`. The AI uses an iterative deepening
+alpha-beta search bounded by `SEARCH_TIME` seconds.
+
+Run `$ python ultimate.py` to play against the AI.
+"""
+
+import time
+
+import numpy as np
+
+import game_engine as engine
+
+FULL_MASK = (1 << 9) - 1
+""" The mask of a full sub-board """
+
+NO_BOARD = -1
+""" The constant for "any sub-board" in the `forced` field of a state """
+
+SEARCH_TIME = 0.9
+""" The time, in seconds, the AI takes to choose a move """
+
+WIN_SCORE = 1_000_000
+""" The score of a won game. Wins found sooner are worth a little more """
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+""" Constants for the kind of value kept on the transposition table of
+`search` """
+
+NODE_COUNT = 0
+""" The number of states visited by `search` (it's never reset by it) """
+
+BOARD_WEIGHTS = [3, 2, 3, 2, 4, 2, 3, 2, 3]
+""" How much each sub-board (or square of a sub-board) is worth in the
+evaluation: the center and corners are on more lines than the edges """
+
+SUB_BOARD_SCORE = 20
+""" The score of a won sub-board, multiplied by its weight """
+
+LINE_SCORES = [0, 1, 4]
+""" The score of an open line (without opponent pieces) by the number of
+pieces of the player on it """
+
+META_LINE_SCORES = [0, 20, 120]
+""" The same as `LINE_SCORES`, but for the lines of the meta-board """
+
+
+def _mask_to_board(mask, piece_type=engine.PIECE_X):
+    board = np.full((3, 3), engine.PIECE_EMPTY, dtype=int)
+    for square in range(9):
+        if mask >> square & 1:
+            board[square // 3, square % 3] = piece_type
+    return board
+
+
+def _build_win_table():
+    return [
+        engine.get_winner(_mask_to_board(mask)) == engine.PIECE_X
+        for mask in range(1 << 9)
+    ]
+
+
+WINS = _build_win_table()
+""" `WINS[mask]` is True if the squares of the mask have three in a row """
+
+EMPTY_SQUARES = [
+    [square for square in range(9) if not mask >> square & 1] for mask in range(1 << 9)
+]
+""" `EMPTY_SQUARES[mask]` is the list of squares that aren't on the mask """
+
+LINE_MASKS = [sum(1 << (3 * i + j) for i, j in line) for line in engine.get_lines()]
+""" The masks of the 8 lines of a 3x3 board """
+
+POPCOUNT = [bin(mask).count("1") for mask in range(1 << 9)]
+""" `POPCOUNT[mask]` is the number of squares of the mask """
+
+_LINE_SCORE_CACHE = dict()
+""" The scores of `_line_score`, keyed by a tuple `(mine, blocked, meta)` """
+
+
+def new_game():
+    """Returns the state of a new game.
+
+    Returns
+    -------
+    state : dict
+        With the keys "x" and "o" (lists with the mask of each sub-board),
+        "meta_x", "meta_o" and "meta_full" (the masks of the sub-boards won
+        by X, won by O and full without a winner), "forced" (the sub-board
+        where the next move must be or NO_BOARD) and "to_move" (PIECE_X or
+        PIECE_O).
+    """
+    return {
+        "x": [0] * 9,
+        "o": [0] * 9,
+        "meta_x": 0,
+        "meta_o": 0,
+        "meta_full": 0,
+        "forced": NO_BOARD,
+        "to_move": engine.PIECE_X,
+    }
+
+
+def encode(state):
+    """Encodes a state in a single integer.
+
+    The bits are the 81 squares of X, the 81 squares of O, the forced
+    sub-board (plus one) in 4 bits and the player to move in 2 bits. The
+    masks of the meta-board aren't needed, since they follow from the
+    squares.
+
+    Parameters
+    ----------
+    state : dict
+        A state, as returned by `new_game`.
+
+    Returns
+    -------
+    code : int
+        The code of the state.
+    """
+    code = state["to_move"]
+    code = code << 4 | (state["forced"] + 1)
+    for masks in (state["o"], state["x"]):
+        for mask in reversed(masks):
+            code = code << 9 | mask
+    return code
+
+
+def decode(code):
+    """Builds the state encoded by `encode`.
+
+    Parameters
+    ----------
+    code : int
+        The code of the state.
+
+    Returns
+    -------
+    state : dict
+        The state, as returned by `new_game`.
+    """
+    state = new_game()
+    for key in ("x", "o"):
+        for board in range(9):
+            state[key][board] = code & FULL_MASK
+            code >>= 9
+    state["forced"] = (code & 0b1111) - 1
+    state["to_move"] = code >> 4
+
+    for board in range(9):
+        if WINS[state["x"][board]]:
+            state["meta_x"] |= 1 << board
+        elif WINS[state["o"][board]]:
+            state["meta_o"] |= 1 << board
+        elif state["x"][board] | state["o"][board] == FULL_MASK:
+            state["meta_full"] |= 1 << board
+    return state
+
+
+def get_winner(state):
+    """Checks if the game is over.
+
+    Returns
+    -------
+    - PIECE_X if X won;
+    - PIECE_O if O won;
+    - DRAW_ID if every sub-board is won or full and nobody won;
+    - PIECE_EMPTY if the game isn't over.
+    """
+    if WINS[state["meta_x"]]:
+        return engine.PIECE_X
+    if WINS[state["meta_o"]]:
+        return engine.PIECE_O
+    if state["meta_x"] | state["meta_o"] | state["meta_full"] == FULL_MASK:
+        return engine.DRAW_ID
+    return engine.PIECE_EMPTY
+
+
+def get_moves(state):
+    """Returns the legal moves of the player to move.
+
+    Parameters
+    ----------
+    state : dict
+        The current state. The game must not be over.
+
+    Returns
+    -------
+    moves : list
+        A list of tuples `(board, square)`, with the index of the sub-board
+        and of the square in it (both from 0 to 8, row by row).
+    """
+    x_masks, o_masks = state["x"], state["o"]
+    if state["forced"] != NO_BOARD:
+        board = state["forced"]
+        return [
+            (board, square) for square in EMPTY_SQUARES[x_masks[board] | o_masks[board]]
+        ]
+
+    closed = state["meta_x"] | state["meta_o"] | state["meta_full"]
+    return [
+        (board, square)
+        for board in EMPTY_SQUARES[closed]
+        for square in EMPTY_SQUARES[x_masks[board] | o_masks[board]]
+    ]
+
+
+def make_move(state, move):
+    """Plays a move on the state.
+
+    Parameters
+    ----------
+    state : dict
+        The current state. It's modified.
+    move : tuple
+        One of the moves returned by `get_moves`.
+
+    Returns
+    -------
+    undo : tuple
+        The information needed by `undo_move` to take the move back.
+    """
+    board, square = move
+    undo = (move, state["forced"], state["meta_x"], state["meta_o"], state["meta_full"])
+
+    if state["to_move"] == engine.PIECE_X:
+        masks, meta_key = state["x"], "meta_x"
+        state["to_move"] = engine.PIECE_O
+    else:
+        masks, meta_key = state["o"], "meta_o"
+        state["to_move"] = engine.PIECE_X
+
+    masks[board] |= 1 << square
+    if WINS[masks[board]]:
+        state[meta_key] |= 1 << board
+    elif state["x"][board] | state["o"][board] == FULL_MASK:
+        state["meta_full"] |= 1 << board
+
+    closed = state["meta_x"] | state["meta_o"] | state["meta_full"]
+    state["forced"] = NO_BOARD if closed >> square & 1 else square
+    return undo
+
+
+def undo_move(state, undo):
+    """Takes back a move played by `make_move`.
+
+    Parameters
+    ----------
+    state : dict
+        The state after the move. It's modified.
+    undo : tuple
+        The return of `make_move`.
+    """
+    (board, square), forced, meta_x, meta_o, meta_full = undo
+    if state["to_move"] == engine.PIECE_X:
+        state["o"][board] &= ~(1 << square)
+        state["to_move"] = engine.PIECE_O
+    else:
+        state["x"][board] &= ~(1 << square)
+        state["to_move"] = engine.PIECE_X
+    state["forced"] = forced
+    state["meta_x"], state["meta_o"], state["meta_full"] = meta_x, meta_o, meta_full
+
+
+def _line_score(mine, blocked, scores):
+    # The score of the lines of a player that aren't blocked.
+    key = (mine, blocked, scores is META_LINE_SCORES)
+    if key not in _LINE_SCORE_CACHE:
+        _LINE_SCORE_CACHE[key] = sum(
+            scores[POPCOUNT[line & mine]] for line in LINE_MASKS if not line & blocked
+        )
+    return _LINE_SCORE_CACHE[key]
+
+
+def evaluate(state):
+    """A heuristic score of a state that isn't over, from the point of view of
+    the player to move.
+
+    Parameters
+    ----------
+    state : dict
+        The current state.
+
+    Returns
+    -------
+    score : int
+        Positive if the player to move is better.
+    """
+    meta_x, meta_o, meta_full = state["meta_x"], state["meta_o"], state["meta_full"]
+    score = _line_score(meta_x, meta_o | meta_full, META_LINE_SCORES)
+    score -= _line_score(meta_o, meta_x | meta_full, META_LINE_SCORES)
+
+    closed = meta_x | meta_o | meta_full
+    x_masks, o_masks = state["x"], state["o"]
+    for board in range(9):
+        if meta_x >> board & 1:
+            score += SUB_BOARD_SCORE * BOARD_WEIGHTS[board]
+        elif meta_o >> board & 1:
+            score -= SUB_BOARD_SCORE * BOARD_WEIGHTS[board]
+        elif not closed >> board & 1:
+            x_mask, o_mask = x_masks[board], o_masks[board]
+            score += BOARD_WEIGHTS[board] * (
+                _line_score(x_mask, o_mask, LINE_SCORES)
+                - _line_score(o_mask, x_mask, LINE_SCORES)
+            )
+
+    return score if state["to_move"] == engine.PIECE_X else -score
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _ordered_moves(state, first_move):
+    # The best move of the last search first, then the moves that win a
+    # sub-board and then the others.
+    masks = state["x"] if state["to_move"] == engine.PIECE_X else state["o"]
+    winning = []
+    others = []
+    for move in get_moves(state):
+        if move == first_move:
+            continue
+        if WINS[masks[move[0]] | 1 << move[1]]:
+            winning.append(move)
+        else:
+            others.append(move)
+    if first_move is None:
+        return winning + others
+    return [first_move] + winning + others
+
+
+def _negamax(state, depth, ply, alpha, beta, table, deadline):
+    global NODE_COUNT
+    NODE_COUNT += 1
+    if NODE_COUNT & 1023 == 0 and time.perf_counter() > deadline:
+        raise _Timeout()
+
+    winner = get_winner(state)
+    if winner == engine.DRAW_ID:
+        return 0, None
+    if winner != engine.PIECE_EMPTY:
+        # The player who just moved won, sooner wins are better.
+        return ply - WIN_SCORE, None
+    if depth == 0:
+        return evaluate(state), None
+
+    key = (*state["x"], *state["o"], state["forced"], state["to_move"])
+    first_move = None
+    if key in table:
+        entry_depth, value, kind, first_move = table[key]
+        if entry_depth >= depth and (
+            kind == EXACT
+            or (kind == LOWER_BOUND and value >= beta)
+            or (kind == UPPER_BOUND and value <= alpha)
+        ):
+            return value, first_move
+
+    first_alpha = alpha
+    best_value = -WIN_SCORE - 1
+    best_move = None
+    for move in _ordered_moves(state, first_move):
+        undo = make_move(state, move)
+        value = -_negamax(state, depth - 1, ply + 1, -beta, -alpha, table, deadline)[0]
+        undo_move(state, undo)
+
+        if value > best_value:
+            best_value = value
+            best_move = move
+
+        alpha = max(alpha, value)
+        if alpha >= beta:
+            break
+
+    if best_value <= first_alpha:
+        kind = UPPER_BOUND
+    elif best_value >= beta:
+        kind = LOWER_BOUND
+    else:
+        kind = EXACT
+    table[key] = (depth, best_value, kind, best_move)
+    return best_value, best_move
+
+
+def search(state, time_limit=SEARCH_TIME):
+    """Chooses a move with an iterative deepening alpha-beta search.
+
+    The search goes one level deeper at a time, starting with the best move
+    of the last level, until the time is over or the game is solved.
+
+    Parameters
+    ----------
+    state : dict
+        The current state. The game must not be over. It's not modified.
+    time_limit : float, default=SEARCH_TIME
+        How long the search may take, in seconds.
+
+    Returns
+    -------
+    move : tuple
+        The best move found.
+    value : int
+        Its score, from the point of view of the player to move. A score
+        greater than `WIN_SCORE - 81` (or smaller than its opposite) means
+        the game is won (or lost).
+    depth : int
+        The depth of the last level completely searched.
+    """
+    deadline = time.perf_counter() + time_limit
+    state = decode(encode(state))
+    table = dict()
+
+    move = get_moves(state)[0]
+    value = 0
+    depth = 0
+    while depth < 81:
+        try:
+            value, move = _negamax(
+                state, depth + 1, 0, -WIN_SCORE - 1, WIN_SCORE + 1, table, deadline
+            )
+        except _Timeout:
+            break
+        depth += 1
+        if abs(value) > WIN_SCORE - 81:
+            break
+    return move, value, depth
+
+
+def to_boards(state):
+    """Returns the sub-boards as matrices, to be drawn by `drawing_engine`.
+
+    Parameters
+    ----------
+    state : dict
+        The current state.
+
+    Returns
+    -------
+    boards : list
+        The 9 sub-boards (row by row), each one a 3x3 numpy ndarray like
+        `engine.BOARD`.
+    winners : list
+        The winner of each sub-board: PIECE_X, PIECE_O, DRAW_ID (if it's full)
+        or PIECE_EMPTY.
+    """
+    boards = []
+    winners = []
+    for board in range(9):
+        boards.append(
+            _mask_to_board(state["x"][board], engine.PIECE_X)
+            + _mask_to_board(state["o"][board], engine.PIECE_O)
+        )
+        if state["meta_x"] >> board & 1:
+            winners.append(engine.PIECE_X)
+        elif state["meta_o"] >> board & 1:
+            winners.append(engine.PIECE_O)
+        elif state["meta_full"] >> board & 1:
+            winners.append(engine.DRAW_ID)
+        else:
+            winners.append(engine.PIECE_EMPTY)
+    return boards, winners
+
+
+def get_playable_boards(state):
+    """Returns the sub-boards where the player to move may play.
+
+    Parameters
+    ----------
+    state : dict
+        The current state.
+
+    Returns
+    -------
+    playable : list
+        The indices of the sub-boards (empty if the game is over).
+    """
+    if get_winner(state) != engine.PIECE_EMPTY:
+        return []
+    if state["forced"] != NO_BOARD:
+        return [state["forced"]]
+    return EMPTY_SQUARES[state["meta_x"] | state["meta_o"] | state["meta_full"]]
+
+
+def _new_game_with_ai():
+    ai_first = int(input("Do you want to be the first or second to play? (1/2) "))
+    ai_piece = engine.PIECE_X if ai_first == 2 else engine.PIECE_O
+    return new_game(), ai_piece
+
+
+def main():
+    """The game loop of the ultimate variant, against the AI."""
+    # Imported here since it opens the game window.
+    import pygame
+
+    import drawing_engine as drawing
+
+    pygame.display.set_caption("Jogo da Velha Supremo")
+    print("Welcome to the ultimate tic-tac-toe.\n")
+    print("Your move decides the sub-board where the AI must play next.")
+    print("Use R to restart the game.")
+    print("Use Q to quit the game.\n")
+    state, ai_piece = _new_game_with_ai()
+
+    while True:
+        winner_type = get_winner(state)
+        boards, winners = to_boards(state)
+        drawing.draw_ultimate(boards, winners, get_playable_boards(state), winner_type)
+        pygame.display.update()
+
+        if winner_type == engine.PIECE_EMPTY and state["to_move"] == ai_piece:
+            move, value, depth = search(state)
+            print(f"AI played {move} (score {value}, depth {depth}).")
+            make_move(state, move)
+            continue
+
+        for event in pygame.event.get():
+            if (
+                event.type == pygame.MOUSEBUTTONDOWN
+                and winner_type == engine.PIECE_EMPTY
+            ):
+                move = drawing.coordinates_to_ultimate_move(pygame.mouse.get_pos())
+                if move in get_moves(state):
+                    make_move(state, move)
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_r:
+                    print()
+                    state, ai_piece = _new_game_with_ai()
+
+                if event.key == pygame.K_q:
+                    print("\nThanks for playing =)")
+                    pygame.quit()
+                    return
+
+            if event.type == pygame.QUIT:
+                print("\nThanks for playing =)")
+                pygame.quit()
+                return
+
+
+if __name__ == "__main__":
+    main()